@@ -0,0 +1,322 @@
+"""
+Precompiled extraction for Amazon pages, evaluated directly on the lxml tree
+behind a response, without building Selector objects. Product pages use the
+spiders' CSS (with parsel's ::text / ::attr() pseudo-elements) translated to
+XPath and compiled once per process. Listing products are read in a single
+walk of each product's subtree (see SubtreeFields).
+"""
+import re
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+_translator = HTMLTranslator()
+
+
+def compile_css(css):
+    """lxml XPath for a parsel CSS selector, relative to the node it is called on."""
+    return etree.XPath(_translator.css_to_xpath(css), smart_strings=False)
+
+
+def first(xpath, node):
+    result = xpath(node)
+    return result[0] if result else None
+
+
+def first_text(element):
+    """The element's first direct text node, as parsel's ::text would return first."""
+    if element.text is not None:
+        return element.text
+    for child in element:
+        if child.tail is not None:
+            return child.tail
+    return None
+
+
+class Match:
+    """
+    A compound selector, tag.class.class (tag optional), for SubtreeFields.
+    `inside` names a context the element must be a descendant of. The value
+    read is the first text node, the `attr` attribute, or with flag=True only
+    whether some element matched.
+    """
+
+    def __init__(self, selector, inside=None, attr=None, flag=False):
+        tag, *classes = selector.split('.')
+        self.tag = tag or None
+        self.classes = frozenset(classes)
+        self.key = min(classes)
+        self.inside = inside
+        self.attr = attr
+        self.flag = flag
+
+    def matches(self, tag, classes, contexts):
+        return (self.tag is None or self.tag == tag) and self.classes <= classes and (self.inside is None or self.inside in contexts)
+
+    def value(self, element):
+        if self.flag:
+            return True
+        return element.get(self.attr) if self.attr else first_text(element)
+
+
+class SubtreeFields:
+    """
+    Field values read in one walk of an element's subtree, rather than one
+    XPath per field. Each field keeps its first match in document order, as
+    with CSS; contexts (name -> Match) are the ancestors fields can require,
+    open for the descendants of a matching element. Rules are indexed by one
+    of their classes, so an element is only tested against rules it may match.
+    """
+
+    def __init__(self, fields, contexts=None):
+        self.fields = fields
+        self.contexts = contexts or {}
+        self.index = {}
+        for name, match in list(fields.items()) + [(name, match) for name, match in self.contexts.items()]:
+            self.index.setdefault(match.key, []).append((name, match))
+
+    def extract(self, root):
+        values = {name: False if match.flag else None for name, match in self.fields.items()}
+        self.visit(root, frozenset(), values, set(self.fields))
+        return values
+
+    def visit(self, element, contexts, values, pending):
+        tag = element.tag
+        if not isinstance(tag, str):
+            # Comments and processing instructions
+            return
+        class_attr = element.get('class')
+        inner = contexts
+        if class_attr:
+            classes = set(class_attr.split())
+            for cls in classes:
+                for name, match in self.index.get(cls, ()):
+                    if not match.matches(tag, classes, contexts):
+                        continue
+                    if name in pending and name in self.fields:
+                        values[name] = match.value(element)
+                        pending.discard(name)
+                    if name in self.contexts:
+                        inner = inner | {name}
+        for child in element:
+            if not pending:
+                return
+            self.visit(child, inner, values, pending)
+
+
+class ListingTemplate:
+    """A search/browse page layout: where its product rows are and how to read a product."""
+
+    def __init__(self, name, rows, fields, max_rows=None):
+        self.name = name
+        self.rows = compile_css(rows)
+        self.fields = fields
+        self.max_rows = max_rows
+
+    def match(self, root):
+        """Product rows of the page when it uses this template, else None."""
+        rows = self.rows(root)
+        if not rows or (self.max_rows is not None and len(rows) > self.max_rows):
+            return None
+        return rows
+
+
+# Product fields, read from the product's data-asin container. The layouts
+# only differ in how product rows are laid out, the product markup is shared.
+# Same matches as the spider's former CSS, e.g. 'h2.a-size-mini a.a-link-normal::attr(href)'
+LISTING_FIELDS = SubtreeFields(
+    {
+        'product_url': Match('a.a-link-normal', inside='title', attr='href'),
+        'product_name': Match('.a-color-base.a-text-normal'),
+        'price': Match('.a-price-whole'),
+        'ratings': Match('span.a-icon-alt'),
+        'reviewcount': Match('.a-size-base.s-underline-text'),
+        'product_image': Match('.s-image', attr='src'),
+        'badges': Match('.a-badge-text', inside='badge_region'),
+        'deals': Match('.a-badge-text', inside='row_link'),
+        'sponsored': Match('div.a-row.a-spacing-micro', flag=True),
+    },
+    contexts={
+        'title': Match('h2.a-size-mini'),
+        'badge_region': Match('.a-badge-region'),
+        'row': Match('.a-row'),
+        'row_link': Match('.s-link-style', inside='row'),
+    },
+)
+
+# Missing values are reported as MISSING_ATTRIBUTE errors
+LISTING_REQUIRED_FIELDS = ('product_name', 'price', 'product_image')
+
+# Checked in order, the first template with product rows wins (same order as detect_page_template always used).
+# Templates 1 and 2 share a row selector, a page with at most 4 such rows is Template 1
+LISTING_TEMPLATES = [
+    ListingTemplate('Template 1 - General', '.a-section.a-spacing-small > .puisg-row', LISTING_FIELDS, max_rows=4),
+    ListingTemplate('Template 2 - Horizontal', '.a-section.a-spacing-small > .puisg-row', LISTING_FIELDS),
+    ListingTemplate('Template 3 - Vertical', '.a-section > .puisg-row', LISTING_FIELDS),
+    ListingTemplate('Template 4 - Vertical', '.puis-card-border', LISTING_FIELDS),
+]
+
+_product_container = etree.XPath('ancestor-or-self::div[@data-asin][1]')
+
+
+def detect_listing_template(root):
+    """(template, product rows) for a listing page's lxml root; the last template with no rows when none match."""
+    for template in LISTING_TEMPLATES:
+        rows = template.match(root)
+        if rows:
+            return template, rows
+    return LISTING_TEMPLATES[-1], []
+
+
+def listing_products(rows):
+    """The distinct data-asin containers of the template's rows, in page order."""
+    # The elements themselves, not id(): lxml proxies are recreated, and their ids reused, once released
+    seen = set()
+    for row in rows:
+        containers = _product_container(row)
+        product = containers[0] if containers else row
+        if product not in seen:
+            seen.add(product)
+            yield product
+
+
+def extract_listing_product(template, product):
+    """
+    Field values of one product element, read in one walk of its subtree, and
+    'sponsored'. product_url is None for rows that are not products.
+    """
+    return template.fields.extract(product)
+
+
+def strip(value):
+    return value.strip() if value else value
+
+
+def strip_all(values):
+    return [value.strip() for value in values if value.strip()]
+
+
+def join_text(values):
+    return ' '.join(values).strip()
+
+
+def pairs(keys, values):
+    return dict(zip((key.strip() for key in keys), (value.strip() for value in values)))
+
+
+class Field:
+    """
+    One item field: CSS selector(s), an optional post-processor and whether
+    the field is required. A single field gets the first match of each
+    selector, a `many` field the full match lists; both are passed to
+    `process` in selector order.
+    """
+
+    def __init__(self, css, process=None, many=False, required=False):
+        self.css = (css,) if isinstance(css, str) else tuple(css)
+        self.process = process
+        self.many = many
+        self.required = required
+
+    def evaluate(self, matches):
+        args = [matches[css] if self.many else (matches[css][0] if matches[css] else None) for css in self.css]
+        return self.process(*args) if self.process else args[0]
+
+
+class Table(Field):
+    """Label/value table read from the first row selector that matches; label and value are relative to a row."""
+
+    def __init__(self, rows, label, value, required=False):
+        super().__init__(rows, many=True, required=required)
+        self.label = compile_css(label)
+        self.value = compile_css(value)
+
+    def evaluate(self, matches):
+        rows = next((matches[css] for css in self.css if matches[css]), [])
+        table = {}
+        for row in rows:
+            label, value = strip(first(self.label, row)), strip(first(self.value, row))
+            if label and value:
+                table[label] = value
+        return table
+
+
+_anchor_id = re.compile(r'^[\w-]*#([\w-]+)')
+find_ids = etree.XPath('id($ids)')
+
+
+class ItemSchema:
+    """
+    Declarative field -> selector spec, compiled once per process. Every
+    distinct selector is evaluated once per page, however many fields read it.
+    Selectors that start at an id ('#feature-bullets ul li', 'span#productTitle')
+    are evaluated inside that element only: one id() lookup, answered from
+    libxml2's id table, finds every such anchor instead of each selector
+    scanning the whole document for its id. Like getElementById, only the
+    first element with a duplicated id is searched. The other selectors still
+    search the whole page. extract() returns the values and a
+    bitmask of the required fields that came back empty (see missing_fields).
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.compiled = {}
+        self.anchors = {}
+        for field in fields.values():
+            for css in field.css:
+                if css not in self.compiled:
+                    self.compiled[css] = compile_css(css)
+                    # A selector group ('#a x, .b y') only starts at the id in its first part
+                    anchor = _anchor_id.match(css) if ',' not in css else None
+                    self.anchors[css] = anchor.group(1) if anchor else None
+        self.anchor_ids = ' '.join(sorted({anchor for anchor in self.anchors.values() if anchor}))
+        required = [name for name, field in fields.items() if field.required]
+        self.required_bits = {name: 1 << bit for bit, name in enumerate(required)}
+
+    def extract(self, root):
+        anchors = {element.get('id'): element for element in find_ids(root, ids=self.anchor_ids)} if self.anchor_ids else {}
+        matches = {}
+        for css, xpath in self.compiled.items():
+            anchor = self.anchors[css]
+            if anchor is None:
+                matches[css] = xpath(root)
+            else:
+                # The selector keeps its id test, which the anchor itself passes (descendant-or-self)
+                matches[css] = xpath(anchors[anchor]) if anchor in anchors else []
+        values = {}
+        missing = 0
+        for name, field in self.fields.items():
+            values[name] = field.evaluate(matches)
+            if field.required and not values[name]:
+                missing |= self.required_bits[name]
+        return values, missing
+
+    def bit(self, name):
+        return self.required_bits[name]
+
+    def missing_fields(self, missing):
+        return [name for name, bit in self.required_bits.items() if missing & bit]
+
+
+STAR_RATING = 'i.a-icon.a-icon-star span.a-icon-alt::text'
+ALT_IMAGES = 'ul.regularAltImageViewLayout li img::attr(src)'
+OFFER_MESSAGE = ' .offer-display-feature-text-message::text'
+
+# AmazonPDPItem fields read from a product page
+PDP_SCHEMA = ItemSchema({
+    'product_name': Field('span#productTitle::text', strip, required=True),
+    'price': Field('span.a-price span.a-offscreen::text', strip, required=True),
+    'brand': Field('a#bylineInfo::text', strip, required=True),
+    'rating': Field(STAR_RATING),
+    'review_count': Field(STAR_RATING, strip, required=True),
+    'image_urls': Field(ALT_IMAGES, many=True),
+    'variant_image_urls': Field(ALT_IMAGES, list, many=True),
+    'variant_product_ids': Field('li[data-csa-c-item-id]::attr(data-csa-c-item-id)', many=True),
+    'product_details': Field(('#detailBullets_feature_div .a-text-bold::text',
+                              '#detailBullets_feature_div .a-text-bold + span::text'), pairs, many=True),
+    'bulletings': Field('#feature-bullets ul li span::text', strip_all, many=True),
+    'product_description': Field('#productDescription *::text', join_text, many=True),
+    'product_info': Table(('#productOverview_feature_div tr', '.prodDetTable tr'),
+                          'td:nth-child(1) span::text', 'td:nth-child(2) span::text'),
+    'ships_from': Field('#fulfillerInfoFeature_feature_div' + OFFER_MESSAGE, strip),
+    'sold_by': Field('#merchantInfoFeature_feature_div' + OFFER_MESSAGE, strip),
+})
@@ -3,11 +3,21 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
-from scrapy import signals
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+from scrapy import signals, Request
+from scrapy.exceptions import NotConfigured, IgnoreRequest
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
+from proxy import ProxyManager
+from ratelimit import RedisRateLimiter
+from credits import CreditLedger
+from checkpoint import CheckpointStore
+from scrapermanagement import ErrorType, ErrorReason
+
 
 class AmazonSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -56,48 +66,386 @@ class AmazonSpiderMiddleware:
         spider.logger.info("Spider opened: %s" % spider.name)
 
 
-class AmazonDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+class CheckpointSpiderMiddleware:
+    """
+    Checkpoints a start URL once its whole request chain is done: every request
+    carrying it in meta['start_url'] (start request, pagination, variants) had
+    its response processed by the spider, and none of them failed. A chain with
+    a failed request (errback, callback exception) is left for the retry.
+    Counting happens where the spider yields requests, so requests re-issued by
+    downloader middlewares (retry, failover, API-mode rewrite) are not counted twice.
+    """
+
+    def __init__(self):
+        self.checkpoint = None
+        self.outstanding = Counter()
+        self.failed = set()
 
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
         s = cls()
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(s.request_dropped, signal=signals.request_dropped)
+        return s
+
+    def spider_opened(self, spider):
+        task_id = getattr(spider, "task_id", "")
+        self.checkpoint = CheckpointStore(task_id) if task_id else None
+
+    def spider_closed(self, spider):
+        if self.checkpoint:
+            self.checkpoint.flush()
+
+    def track(self, request):
+        start_url = request.meta.get("start_url")
+        if not start_url:
+            return request
+        self.outstanding[start_url] += 1
+        errback = request.errback
+
+        def request_failed(failure):
+            # Without an errback of its own the failure goes on to process_spider_exception
+            failure.request.meta["checkpoint_finished"] = True
+            self.finish(start_url, failed=True)
+            return errback(failure) if errback else failure
+
+        request.errback = request_failed
+        return request
+
+    def finish(self, start_url, failed=False):
+        if start_url not in self.outstanding:
+            return
+        if failed:
+            self.failed.add(start_url)
+        self.outstanding[start_url] -= 1
+        if self.outstanding[start_url] > 0:
+            return
+        del self.outstanding[start_url]
+        if start_url in self.failed:
+            self.failed.discard(start_url)
+        elif self.checkpoint:
+            self.checkpoint.mark_done(start_url)
+
+    # Both the sync and async hooks, so it runs on Scrapy before and after 2.13
+    def process_start_requests(self, start_requests, spider):
+        for request in start_requests:
+            yield self.track(request)
+
+    async def process_start(self, start):
+        async for request in start:
+            yield self.track(request) if isinstance(request, Request) else request
+
+    def process_spider_output(self, response, result, spider):
+        # Requests are scheduled as they are yielded, so the chain's count has
+        # grown by all of them before this response is counted as finished
+        for entry in result:
+            if isinstance(entry, Request):
+                self.track(entry)
+            yield entry
+        self.finish(response.meta.get("start_url"))
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for entry in result:
+            if isinstance(entry, Request):
+                self.track(entry)
+            yield entry
+        self.finish(response.meta.get("start_url"))
+
+    def process_spider_exception(self, response, exception, spider):
+        if not response.meta.get("checkpoint_finished"):
+            self.finish(response.meta.get("start_url"), failed=True)
+
+    def request_dropped(self, request, spider):
+        # Refused by the scheduler (duplicate): nothing left to wait for
+        self.finish(request.meta.get("start_url"))
+
+
+class AmazonDownloaderMiddleware:
+    """
+    Sends every request through a proxy provider, so spiders only deal in real
+    Amazon URLs. The provider comes from request.meta['proxy_provider'] when
+    set (failover pins it), otherwise ProxyManager picks one.
+
+    PROXY_MODE = "port" routes the request through the provider's HTTP proxy
+    port (request.meta['proxy'], authenticated by HttpProxyMiddleware), which
+    keeps the URL and lets Scrapy reuse connections to the proxy endpoint.
+    PROXY_MODE = "api" rewrites the URL into the provider's API URL and maps
+    the response back to the real URL. Set meta['dont_proxy'] to skip.
+    A request sent as a provider's circuit breaker probe is tagged with
+    meta['breaker_probe'], so only its outcome closes the breaker.
+    """
+
+    def __init__(self, mode):
+        if mode not in ("port", "api"):
+            raise NotConfigured(f"Unsupported PROXY_MODE: {mode}")
+        self.mode = mode
+        self.proxy_manager = ProxyManager()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = cls(crawler.settings.get("PROXY_MODE", "port"))
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
         return s
 
+    @staticmethod
+    def is_proxied(request):
+        return bool(request.meta.get("proxy")) or ProxyManager.provider_for_url(request.url) is not None
+
     def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
+        if request.meta.get("dont_proxy") or self.is_proxied(request):
+            return None
+
+        target_url = request.url
+        request.meta.setdefault("original_url", target_url)
+        provider = request.meta.get("proxy_provider") or self.proxy_manager.choose_provider(
+            exclude=request.meta.get("proxy_tried", ())
+        )
+        if provider is not None and self.mode == "port":
+            proxy = self.proxy_manager.get_proxy_endpoint(provider)
+        elif provider is not None:
+            proxy = self.proxy_manager.get_proxy_url(target_url, provider)
+        else:
+            proxy = None
+
+        if proxy is not None:
+            probe = ProxyManager.get_breaker(provider).before_request()
+            if probe is not None:
+                request.meta["breaker_probe"] = probe
+
+        if proxy is None:
+            error_manager = getattr(spider, "error_manager", None)
+            if error_manager is not None and provider is None:
+                # Every provider was tried or has its circuit breaker open: not a credentials problem
+                error_manager.handle_error(
+                    (ErrorType.SCRAPER_ERROR, ErrorReason.NO_PROXY_AVAILABLE),
+                    request_url=target_url,
+                    exception="No proxy provider available (all tried or circuit breakers open)",
+                )
+            elif error_manager is not None:
+                error_manager.handle_error(
+                    (ErrorType.SCRAPER_ERROR, ErrorReason.INVALID_API_KEY),
+                    request_url=target_url,
+                    exception=f"No proxy available (provider: {provider})",
+                )
+            raise IgnoreRequest(f"No proxy available for {target_url}")
+
+        if self.mode == "port":
+            request.meta["proxy"] = proxy
+            request.meta["proxy_provider"] = provider
+            request.meta["proxy_url"] = urlsplit(proxy).hostname
+            request.meta["target_url"] = target_url
+            return None
+
+        # API mode: the downloader needs a different URL, so hand back a new request
+        return request.replace(
+            url=proxy,
+            meta={**request.meta, "proxy_provider": provider, "proxy_url": proxy, "target_url": target_url},
+            dont_filter=True,
+        )
+
+    def process_response(self, request, response, spider):
+        target_url = request.meta.get("target_url")
+        if target_url and response.url != target_url:
+            # Callbacks see the Amazon URL, so urljoin/follow resolve against Amazon rather than the proxy API
+            return response.replace(url=target_url)
+        return response
+
+    def spider_opened(self, spider):
+        spider.logger.info(f"Spider opened: {spider.name} (proxy mode: {self.mode})")
+
+
+class ProxyRateLimitMiddleware:
+    """
+    Caps concurrency and requests/sec per proxy provider across every crawl on
+    every host, using a Redis token bucket and semaphore. Requests wait here
+    until a slot is free; the wait is recorded in the crawl stats under
+    ratelimit/<provider>/... and in request.meta['ratelimit_wait'].
+    """
+
+    def __init__(self, crawler, limiter, limits):
+        self.stats = crawler.stats
+        self.limiter = limiter
+        self.limits = limits
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        limits = crawler.settings.getdict("PROXY_RATE_LIMITS")
+        redis_url = crawler.settings.get("RATELIMIT_REDIS_URL")
+        if not limits or not redis_url:
+            raise NotConfigured("PROXY_RATE_LIMITS and RATELIMIT_REDIS_URL are required")
+        # A lease must outlive the longest download it guards
+        limiter = RedisRateLimiter(redis_url, lease_ttl=crawler.settings.getfloat("DOWNLOAD_TIMEOUT") + 60)
+        s = cls(crawler, limiter, limits)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def get_provider(self, request):
+        return request.meta.get("proxy_provider") or ProxyManager.provider_for_url(request.url)
+
+    async def process_request(self, request, spider):
+        provider = self.get_provider(request)
+        if provider not in self.limits:
+            return None
+
+        started = time.monotonic()
+        lease_id = await self.limiter.acquire(provider, **self.limits[provider])
+        wait = time.monotonic() - started
+
+        request.meta["ratelimit_lease"] = (provider, lease_id)
+        request.meta["ratelimit_wait"] = wait
+        self.stats.inc_value(f"ratelimit/{provider}/requests")
+        self.stats.inc_value(f"ratelimit/{provider}/wait_seconds", wait)
+        self.stats.max_value(f"ratelimit/{provider}/max_wait_seconds", wait)
+        return None
+
+    async def release(self, request):
+        lease = request.meta.pop("ratelimit_lease", None)
+        if lease:
+            await self.limiter.release(*lease)
+
+    async def process_response(self, request, response, spider):
+        await self.release(request)
+        return response
+
+    async def process_exception(self, request, exception, spider):
+        await self.release(request)
         return None
 
+    async def spider_closed(self, spider):
+        await self.limiter.close()
+
+
+class ProxyFailoverMiddleware:
+    """
+    Records every proxied download's outcome (success, latency, block) in the
+    shared ProxyManager stats, and fails over to another provider when a
+    provider errors, blocks (403/429/captcha) or returns a 5xx. Requests that
+    ran out of providers continue to RetryMiddleware and the spider errback.
+    """
+
+    blocked_statuses = {403, 429}
+    failover_statuses = {403, 429, 500, 502, 503, 504}
+
+    def __init__(self, crawler):
+        self.stats = crawler.stats
+        self.proxy_manager = ProxyManager()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def is_blocked(self, response):
+        return response.status in self.blocked_statuses or (response.status == 200 and b"validateCaptcha" in response.body)
+
+    @staticmethod
+    def get_provider(request):
+        return request.meta.get("proxy_provider") or ProxyManager.provider_for_url(request.url)
+
+    def failover(self, request, spider):
+        """
+        Re-issue the real URL pinned to a provider it has not tried yet, or
+        None. AmazonDownloaderMiddleware proxies it again.
+        """
+        tried = request.meta.get("proxy_tried", []) + [self.get_provider(request)]
+        next_provider = self.proxy_manager.choose_provider(exclude=tried)
+        if next_provider is None:
+            return None
+        target_url = request.meta.get("target_url") or ProxyManager.unwrap_url(request.url)
+        spider.logger.info(f"Failing over {target_url} from {tried[-1]} to {next_provider}")
+        self.stats.inc_value(f"proxy/{tried[-1]}/failovers")
+        meta = {k: v for k, v in request.meta.items() if k not in ("proxy", "_auth_proxy", "proxy_url", "target_url", "breaker_probe")}
+        new_request = request.replace(
+            url=target_url,
+            meta={**meta, "proxy_provider": next_provider, "proxy_tried": tried},
+            dont_filter=True,
+        )
+        new_request.headers.pop(b"Proxy-Authorization", None)
+        return new_request
+
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
+        provider = self.get_provider(request)
+        if provider is None:
+            return response
+
+        blocked = self.is_blocked(response)
+        success = not blocked and response.status < 500
+        ProxyManager.record_outcome(provider, success, request.meta.get("download_latency"), blocked,
+                                    request.meta.get("breaker_probe"))
+        self.stats.inc_value(f"proxy/{provider}/{'success' if success else 'blocked' if blocked else 'failed'}")
 
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
+        if blocked or response.status in self.failover_statuses:
+            return self.failover(request, spider) or response
         return response
 
     def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
+        provider = self.get_provider(request)
+        if provider is None or isinstance(exception, IgnoreRequest):
+            return None
+        ProxyManager.record_outcome(provider, False, probe=request.meta.get("breaker_probe"))
+        self.stats.inc_value(f"proxy/{provider}/failed")
+        return self.failover(request, spider)
 
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+    def spider_closed(self, spider):
+        spider.logger.info(f"Proxy provider stats: {ProxyManager.stats_snapshot()}")
+        ProxyManager.save_stats()
+
+
+class ProxyCreditMiddleware:
+    """
+    Counts proxy credits per provider for the crawl: providers bill each
+    successful request (PROXY_BILLABLE_STATUSES) at PROXY_CREDIT_COSTS credits.
+    Scraped items are attributed to the provider that fetched their page, so
+    the report can show credits per item. Totals go to proxy_credit_usage when
+    the spider closes; the daily spend feeds the publisher's budget check.
+    """
+
+    def __init__(self, crawler, costs, billable_statuses):
+        self.stats = crawler.stats
+        self.costs = costs
+        self.billable_statuses = billable_statuses
+        self.ledger = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        costs = crawler.settings.getdict("PROXY_CREDIT_COSTS")
+        if not costs:
+            raise NotConfigured("PROXY_CREDIT_COSTS is required")
+        s = cls(crawler, costs, set(crawler.settings.getlist("PROXY_BILLABLE_STATUSES", [200, 404, 410])))
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
 
     def spider_opened(self, spider):
-        spider.logger.info("Spider opened: %s" % spider.name)
+        self.ledger = CreditLedger(getattr(spider, "task_id", ""), getattr(spider, "celery_id", ""), spider.name, self.costs)
+
+    def process_response(self, request, response, spider):
+        provider = request.meta.get("proxy_provider")
+        if provider is None or self.ledger is None:
+            return response
+        billed = int(response.status) in self.billable_statuses
+        self.ledger.record_request(provider, billed)
+        if billed:
+            self.stats.inc_value(f"proxy/{provider}/credits", self.costs.get(provider, 1))
+        return response
+
+    def item_scraped(self, item, response, spider):
+        provider = response.meta.get("proxy_provider") if response is not None else None
+        if provider is not None and self.ledger is not None:
+            self.ledger.record_item(provider)
+
+    def spider_closed(self, spider):
+        if self.ledger is None:
+            return
+        per_item = self.ledger.credits_per_item()
+        spider.logger.info(
+            f"Proxy credits: {dict(self.ledger.usage)}"
+            + (f", {per_item:.2f} credits per item" if per_item is not None else "")
+        )
+        try:
+            self.ledger.save()
+        except Exception as e:
+            spider.logger.error(f"Failed to save proxy credit usage: {e}")
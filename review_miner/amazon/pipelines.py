@@ -6,6 +6,65 @@
 
 # useful for handling different item types with a single interface
 import json
+from itemadapter import ItemAdapter
+from lxml import etree
+from parsel import Selector, SelectorList
+from scrapy.exceptions import DropItem
+from scrapy.http import Response
+
+
+def detach(value, depth=0):
+    """
+    Plain Python copy of an item value: selectors become their extracted
+    text, lxml smart strings become str, containers are copied. Raises
+    ValueError for values that would keep a response or its DOM alive.
+    """
+    if value is None or isinstance(value, (bool, int, float)) or type(value) is str:
+        return value
+    if depth > 10:
+        raise ValueError("value nested too deeply")
+    if isinstance(value, str):
+        # lxml smart strings reference their parent element, and through it the whole tree
+        return str(value)
+    if isinstance(value, SelectorList):
+        return value.getall()
+    if isinstance(value, Selector):
+        return value.get()
+    if isinstance(value, (Response, etree._Element)):
+        raise ValueError(f"{type(value).__name__} in item")
+    if isinstance(value, dict):
+        return {detach(k, depth + 1): detach(v, depth + 1) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [detach(v, depth + 1) for v in value]
+    return value
+
+
+class DetachItemPipeline:
+    """
+    Runs first so items reach later pipelines and the feed exporters as plain
+    values, not holding the page DOM of the response they came from. Items
+    that still reference a response or an lxml element are dropped.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        for field, value in list(adapter.items()):
+            try:
+                detached = detach(value)
+            except ValueError as e:
+                self.stats.inc_value("detach/rejected")
+                raise DropItem(f"Field {field!r} references the response: {e}")
+            if type(detached) is not type(value):
+                self.stats.inc_value(f"detach/converted/{field}")
+            adapter[field] = detached
+        return item
 
 class JsonExportPipeline:
     def open_spider(self, spider):
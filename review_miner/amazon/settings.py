@@ -7,6 +7,8 @@
 #     https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 #     https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+from config import environment, app_env, proxy_mode
+
 BOT_NAME = "amazon"
 
 SPIDER_MODULES = ["amazon.spiders"]
@@ -70,27 +72,59 @@ CONCURRENT_REQUESTS = 50
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
-#    "amazon.middlewares.AmazonSpiderMiddleware": 543,
-#}
+SPIDER_MIDDLEWARES = {
+    # Marks a start URL finished for resume once all its pages are done
+    "amazon.middlewares.CheckpointSpiderMiddleware": 543,
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 #DOWNLOADER_MIDDLEWARES = {
 #    "amazon.middlewares.AmazonDownloaderMiddleware": 543,
 #}
+DOWNLOADER_MIDDLEWARES = {
+    # Proxies every request; before HttpProxyMiddleware (750) so it authenticates the proxy-port connection
+    "amazon.middlewares.AmazonDownloaderMiddleware": 543,
+    # Sees download errors before RetryMiddleware (550) so it can switch provider first
+    "amazon.middlewares.ProxyFailoverMiddleware": 900,
+    # Counts every provider response, including those failover replaces
+    "amazon.middlewares.ProxyCreditMiddleware": 910,
+    # Last before the download handler, so retries and redirects take a new slot
+    "amazon.middlewares.ProxyRateLimitMiddleware": 950,
+}
+
+# "port": provider HTTP proxy port with pooled keep-alive connections; "api": provider API URLs
+PROXY_MODE = proxy_mode
+
+# Cluster-wide limits per proxy provider, shared by all workers through Redis. Keep them within the plan's
+# concurrency and rate; CONCURRENT_REQUESTS below is only the cap of a single crawl
+PROXY_RATE_LIMITS = {
+    "scraperapi": {"concurrency": 50, "rate": 20, "burst": 20},
+    "scrapeops": {"concurrency": 25, "rate": 10, "burst": 10},
+}
+RATELIMIT_REDIS_URL = environment[app_env]["redis"]
+
+# Credits billed per successful request by each provider (plain requests; rendering or premium pools cost more)
+PROXY_CREDIT_COSTS = {
+    "scraperapi": 1,
+    "scrapeops": 1,
+}
+# Statuses the providers count as successful, and bill
+PROXY_BILLABLE_STATUSES = [200, 404, 410]
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+EXTENSIONS = {
+    # Per-crawl event log, request/item counters and checkpointing of finished start URLs
+    "scrapermanagement.ScrapySignals": 500,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    "amazon.pipelines.AmazonPipeline": 300,
-#}
+ITEM_PIPELINES = {
+    # Before anything keeps items around: turns selector values into plain values, drops items holding a response
+    "amazon.pipelines.DetachItemPipeline": 100,
+}
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
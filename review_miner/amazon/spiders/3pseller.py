@@ -1,47 +1,31 @@
 import scrapy
-from scrapermanagement import ScrapySignals, ErrorManager,ErrorType, ErrorReason
+from scrapermanagement import ErrorManager,ErrorType, ErrorReason
 from amazon.spiders.amz_utils import log_response_info
-from proxy import  ProxyManager
+from url_sources import resolve_start_urls
 class AmazonSpider(scrapy.Spider):
     name = "amz_3p"
 
-    def __init__(self, urls='', task_id='', celery_id='', *args, **kwargs):
+    def __init__(self, urls='', url_source='', task_id='', celery_id='', *args, **kwargs):
         super(AmazonSpider, self).__init__(*args, **kwargs)
-        self.start_urls = urls.split(',') if urls else ['https://www.amazon.com/dp/B0DCNQM1PY']
+        self.start_urls = resolve_start_urls(urls, url_source, ['https://www.amazon.com/dp/B0DCNQM1PY'], task_id=task_id)
         self.task_id = task_id
         self.celery_id = celery_id
-        self.proxy_manager = ProxyManager()
         self.error_manager = ErrorManager(task_id, celery_id, self.name)
 
-    @classmethod
-    def from_crawler(cls, crawler, *args, **kwargs):
-        spider = super(AmazonSpider, cls).from_crawler(crawler, *args, **kwargs)
-        ScrapySignals.connect_signals(crawler, spider.task_id, spider.celery_id)
-        return spider
-    
     def start_requests(self):
         """
-        Use ProxyManager to generate URLs with ScraperAPI and handle errors.
+        Request the Amazon URLs directly; AmazonDownloaderMiddleware routes them through a proxy provider.
         """
         for url in self.start_urls:
             try:
-                # Get ScraperAPI proxied URL
-                new_url = self.proxy_manager.get_proxy_url(url, "scraperapi")
-                if new_url:
-                    self.logger.info(f"Starting request to {new_url} with ScraperAPI")
-                    yield scrapy.Request(
-                        url=new_url,
-                        callback=self.parse,
-                        errback=self.handle_network_error,
-                        meta={'original_url': url, 'page_count': 1},
-                        dont_filter=True
-                    )
-                else:
-                    # Handle case where ScraperAPI URL generation fails
-                    self.error_manager.handle_error(
-                        (ErrorType.SCRAPER_ERROR, ErrorReason.INVALID_API_KEY),
-                        request_url=url
-                    )
+                self.logger.info(f"Starting request to {url}")
+                yield scrapy.Request(
+                    url=url,
+                    callback=self.parse,
+                    errback=self.handle_network_error,
+                    meta={'original_url': url, 'page_count': 1, 'start_url': url},
+                    dont_filter=True
+                )
             except Exception as e:
                 # Handle unknown errors during request generation
                 self.error_manager.handle_error(
@@ -50,37 +34,6 @@ class AmazonSpider(scrapy.Spider):
                     exception=f"Error during start_requests: {str(e)}"
                 )
 
-    def fallback_to_scrapeops(self, failure):
-        """
-        Fall back to ScrapeOps proxy if ScraperAPI fails.
-        """
-        original_url = failure.request.meta['original_url']
-        try:
-            # Get ScrapeOps proxied URL
-            scrapeops_url = self.proxy_manager.get_proxy_url(original_url, "scrapeops")
-            if scrapeops_url:
-                self.logger.info(f"Falling back to ScrapeOps for {original_url}")
-                yield scrapy.Request(
-                    url=scrapeops_url,
-                    callback=self.parse,
-                    errback=self.handle_network_error,
-                    meta={**failure.request.meta, 'original_url': original_url},
-                    dont_filter=True
-                )
-            else:
-                # Handle case where ScrapeOps URL generation fails
-                self.error_manager.handle_error(
-                    (ErrorType.SCRAPER_ERROR, ErrorReason.INVALID_API_KEY),
-                    request_url=original_url,
-                    exception="Failed to generate fallback ScrapeOps URL."
-                )
-        except Exception as e:
-            # Handle unknown errors during fallback
-            self.error_manager.handle_error(
-                (ErrorType.SCRAPER_ERROR, ErrorReason.UNKNOWN_ERROR),
-                request_url=original_url,
-                exception=f"Error in fallback_to_scrapeops: {str(e)}"
-            )
     def handle_network_error(self, failure):
         """Delegate network errors to ErrorManager."""
         self.error_manager.handle_network_error(failure)
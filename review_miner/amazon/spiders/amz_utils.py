@@ -2,6 +2,7 @@ import os
 import logging
 import re
 from urllib.parse import urlparse
+from amazon.extraction import detect_listing_template
 
 
 def log_response_info(response):
@@ -11,31 +12,17 @@ def log_response_info(response):
 
 
 def detect_page_template(response, logger, page_count):
-    # Detect page template type
-    if response.css('.a-section.a-spacing-small > .puisg-row'):
-        # Check the number of products to differentiate between General and Horizontal templates
-        product_list = response.css('.a-section.a-spacing-small > .puisg-row')
-        if len(product_list) < 5:
-            # Template 1 - General
-            template_type = "Template 1 - General"
-        else:
-            # Template 2 - Horizontal
-            template_type = "Template 2 - Horizontal"
-    elif response.css('.a-section > .puisg-row'):
-        # Template 3 - Vertical
-        product_list = response.css('.a-section > .puisg-row')
-        template_type = "Template 2 - Horizontal"
-    else:
-        # Fallback to an alternative vertical template if neither is found
-        product_list = response.css('.puis-card-border')
-        template_type = "Template 4 - Vertical "
+    """
+    Detect the listing layout (see amazon.extraction.LISTING_TEMPLATES) and
+    return the template and its product rows as lxml elements.
+    """
+    template, product_list = detect_listing_template(response.selector.root)
+
+    logger.info(f"Using {template.name}. Found {len(product_list)} products on page {page_count} of {response.url}")
 
-    print("=======", template_type)
-    logger.info(f"Using {template_type}. Found {len(product_list)} products on page {page_count} of {response.url}")
-    
-    return template_type, product_list
+    return template, product_list
 
-def extract_asin(self, url): 
+def extract_asin(url):
     path = urlparse(url).path
     if path.startswith('/dp'):
         asin = path.split('/')[2]
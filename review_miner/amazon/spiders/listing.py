@@ -1,50 +1,34 @@
 import scrapy
 from ..items import AmazonListingItems
-from scrapermanagement import ScrapySignals, ErrorManager,ErrorType, ErrorReason
+from scrapermanagement import ErrorManager,ErrorType, ErrorReason
 from amazon.spiders.amz_utils import log_response_info ,detect_page_template
-from proxy import  ProxyManager
+from amazon.extraction import listing_products, extract_listing_product, LISTING_REQUIRED_FIELDS
+from url_sources import resolve_start_urls
 class AmazonSpider(scrapy.Spider):
     name = "amz_listings"
 
-    def __init__(self, urls='', task_id='', celery_id='', *args, **kwargs):
+    def __init__(self, urls='', url_source='', task_id='', celery_id='', *args, **kwargs):
         super(AmazonSpider, self).__init__(*args, **kwargs)
-        self.start_urls = urls.split(',') if urls else ['https://www.amazon.com/b?node=196609011']
+        self.start_urls = resolve_start_urls(urls, url_source, ['https://www.amazon.com/b?node=196609011'], task_id=task_id)
         self.task_id = task_id
         self.celery_id = celery_id
-        self.proxy_manager = ProxyManager()
         self.error_manager = ErrorManager(task_id, celery_id, self.name)
         self.item_cls = AmazonListingItems()
 
-    @classmethod
-    def from_crawler(cls, crawler, *args, **kwargs):
-        spider = super(AmazonSpider, cls).from_crawler(crawler, *args, **kwargs)
-        ScrapySignals.connect_signals(crawler, spider.task_id, spider.celery_id)
-        return spider
-
     def start_requests(self):
         """
-        Use ProxyManager to generate URLs with ScraperAPI and handle errors.
+        Request the Amazon URLs directly; AmazonDownloaderMiddleware routes them through a proxy provider.
         """
         for url in self.start_urls:
             try:
-                # Get ScraperAPI proxied URL
-                new_url = self.proxy_manager.get_proxy_url(url, "scraperapi")
-                if new_url:
-                    self.logger.info(f"Starting request to {new_url} with ScraperAPI")
-                    yield scrapy.Request(
-                        url=new_url,
-                        callback=self.parse,
-                        errback=self.handle_network_error,
-                        meta={'original_url': url, 'proxy_url': new_url, 'page_count': 1},
-                        dont_filter=True
-                    )
-                else:
-                    # Handle case where ScraperAPI URL generation fails
-                    self.error_manager.handle_error(
-                        (ErrorType.SCRAPER_ERROR, ErrorReason.INVALID_API_KEY),
-                        request_url=url,
-                        proxy_url=None
-                    )
+                self.logger.info(f"Starting request to {url}")
+                yield scrapy.Request(
+                    url=url,
+                    callback=self.parse,
+                    errback=self.handle_network_error,
+                    meta={'original_url': url, 'page_count': 1, 'start_url': url},
+                    dont_filter=True
+                )
             except Exception as e:
                 # Handle unknown errors during request generation
                 self.error_manager.handle_error(
@@ -54,48 +38,14 @@ class AmazonSpider(scrapy.Spider):
                     exception=f"Error during start_requests: {str(e)}"
                 )
 
-    def fallback_to_scrapeops(self, failure):
-        """
-        Fall back to ScrapeOps proxy if ScraperAPI fails.
-        """
-        original_url = failure.request.meta['original_url']
-        try:
-            # Get ScrapeOps proxied URL
-            scrapeops_url = self.proxy_manager.get_proxy_url(original_url, "scrapeops")
-            if scrapeops_url:
-                self.logger.info(f"Falling back to ScrapeOps for {original_url}")
-                yield scrapy.Request(
-                    url=scrapeops_url,
-                    callback=self.parse,
-                    errback=self.handle_network_error,
-                    meta={**failure.request.meta, 'proxy_url': scrapeops_url},
-                    dont_filter=True
-                )
-            else:
-                # Handle case where ScrapeOps URL generation fails
-                self.error_manager.handle_error(
-                    (ErrorType.SCRAPER_ERROR, ErrorReason.INVALID_API_KEY),
-                    request_url=original_url,
-                    proxy_url=None,
-                    exception="Failed to generate fallback ScrapeOps URL."
-                )
-        except Exception as e:
-            # Handle unknown errors during fallback
-            self.error_manager.handle_error(
-                (ErrorType.SCRAPER_ERROR, ErrorReason.UNKNOWN_ERROR),
-                request_url=original_url,
-                proxy_url=None,
-                exception=f"Error in fallback_to_scrapeops: {str(e)}"
-            )    
-            
     def handle_network_error(self, failure):
         """Delegate network errors to ErrorManager."""
         self.error_manager.handle_network_error(failure)
 
     def parse(self, response):
         log_response_info(response)
-        original_url = response.meta.get('original_url')
-        proxy_url = response.meta.get('proxy_url', response.url)
+        original_url = response.meta.get('original_url', response.url)
+        proxy_url = response.meta.get('proxy_url')
         page_count = response.meta.get('page_count', 1)
 
         # Handle HTTP response errors
@@ -199,8 +149,8 @@ class AmazonSpider(scrapy.Spider):
                 for ad in ads_data:
                     yield ad
 
-                # Detect the page template type and get the list of products
-                template_type, product_list = detect_page_template(response, self.logger, page_count)
+                # Detect the page template; its rows are the products, each read in one walk of its subtree
+                template, product_list = detect_page_template(response, self.logger, page_count)
 
                 if not product_list:
                     self.error_manager.handle_error(
@@ -209,39 +159,37 @@ class AmazonSpider(scrapy.Spider):
                         exception="No products detected on the page."
                     )
                     return
-                
-                product_list = response.css('div[data-asin]')
-                for product in product_list:
-                    try:
-                        is_sponsored = bool(product.css('div.a-row.a-spacing-micro'))
 
-                        # Extract the product URL specific to the product element
-                        product_url = product.css("h2.a-size-mini a.a-link-normal::attr(href)").get()
-                        if not product_url:
+                for product in listing_products(product_list):
+                    try:
+                        values = extract_listing_product(template, product)
+                        if not values['product_url']:
                             continue
 
-                        product_url = f"https://www.amazon.com{product_url}"
-                        product_name = self.error_manager.validate_attribute(response, product, "product_name", ".a-color-base.a-text-normal::text", original_url)
-                        price = self.error_manager.validate_attribute(response, product, "price", ".a-price-whole::text", original_url)
-                        ratings = product.css('span.a-icon-alt::text').get()
-                        review_count = product.css('.a-size-base.s-underline-text::text').get()
-                        product_image = self.error_manager.validate_attribute(response, product, "product_image", ".s-image::attr(src)", original_url)
+                        for field in LISTING_REQUIRED_FIELDS:
+                            if not values[field]:
+                                self.error_manager.handle_error(
+                                    (ErrorType.PARSING_ERROR, ErrorReason.MISSING_ATTRIBUTE),
+                                    request_url=original_url,
+                                    proxy_url=response.url,
+                                    exception=f"Missing attribute: {field}"
+                                )
 
                         yield {
-                            "type": "sponsored_product" if is_sponsored else "organic_product",
+                            "type": "sponsored_product" if values['sponsored'] else "organic_product",
                             "request_url": original_url,
                             "response_url": response.url,
-                            "product_name": product_name,
-                            "product_url": product_url,
+                            "product_name": values['product_name'],
+                            "product_url": f"https://www.amazon.com{values['product_url']}",
                             "source": "Amazon",
-                            "price": price,
+                            "price": values['price'],
                             "page_number": page_count,
-                            "ratings": ratings,
-                            "reviewcount": review_count,
-                            "product_image": product_image,
-                            "badges": product.css('.a-badge-region .a-badge-text::text').get(),
-                            "deals": product.css('.a-row .s-link-style .a-badge-text::text').get(),
-                            "sponsored": is_sponsored
+                            "ratings": values['ratings'],
+                            "reviewcount": values['reviewcount'],
+                            "product_image": values['product_image'],
+                            "badges": values['badges'],
+                            "deals": values['deals'],
+                            "sponsored": values['sponsored']
                         }
                     except Exception as e:
                         self.error_manager.handle_error(
@@ -256,27 +204,17 @@ class AmazonSpider(scrapy.Spider):
                 if next_page_url and page_count < 5:  # Limit scraping to 5 pages
                     # Construct the next page URL with Amazon domain
                     next_page_url = f"https://www.amazon.com{next_page_url}"
-                    
-                    # Use the proxy manager to generate a proxy URL
-                    proxied_url = self.proxy_manager.get_proxy_url(next_page_url, "scraperapi")
 
-                    if proxied_url:
-                        yield response.follow(
-                            proxied_url,
-                            callback=self.parse,
-                            meta={
-                                "original_url": next_page_url,
-                                "proxy_url": proxied_url,
-                                "page_count": page_count + 1,
-                            }
-                        )
-                    else:
-                        self.error_manager.handle_error(
-                            (ErrorType.SCRAPER_ERROR, ErrorReason.INVALID_API_KEY),
-                            request_url=next_page_url,
-                            proxy_url=None,
-                            exception="Failed to generate proxy URL for next page."
-                        )
+                    yield response.follow(
+                        next_page_url,
+                        callback=self.parse,
+                        errback=self.handle_network_error,
+                        meta={
+                            "original_url": next_page_url,
+                            "page_count": page_count + 1,
+                            "start_url": response.meta.get("start_url"),
+                        }
+                    )
             except Exception as e:
                         self.error_manager.handle_error(
                             (ErrorType.PARSING_ERROR, ErrorReason.UNEXPECTED_STRUCTURE),
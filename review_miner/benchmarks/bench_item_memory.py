@@ -0,0 +1,83 @@
+"""
+RSS over a long PDP crawl when scraped items still hold selectors from their
+page, as AmazonPDPSpider used to put in ships_from/sold_by, versus the same
+items passed through DetachItemPipeline.
+
+Each mode runs in its own process: --pages PDP responses are built from the
+fixture, an item is taken from each and kept, the way a buffering pipeline or
+exporter keeps them, and RSS is sampled every --sample pages.
+
+    cd review_miner && python benchmarks/bench_item_memory.py --pages 10000
+"""
+import argparse
+import glob
+import os
+import subprocess
+import sys
+
+project_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_path)
+
+FIXTURES_DIR = os.path.join(project_path, 'benchmarks', 'fixtures')
+URL = 'https://www.amazon.com/dp/B093QLTD9Q'
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+
+def run(mode, pages, sample):
+    from scrapy.http import HtmlResponse
+    from scrapy.utils.test import get_crawler
+    from amazon.items import AmazonPDPItem
+    from amazon.pipelines import DetachItemPipeline
+
+    with open(sorted(glob.glob(os.path.join(FIXTURES_DIR, 'pdp_*.html')))[0], 'rb') as f:
+        body = f.read()
+    pipeline = DetachItemPipeline.from_crawler(get_crawler())
+
+    kept = []
+    print(f'{mode} 0 {rss_mb():.1f}', flush=True)
+    for page in range(1, pages + 1):
+        response = HtmlResponse(url=URL, body=body, encoding='utf-8')
+        item = AmazonPDPItem()
+        item['product_name'] = response.css('span#productTitle::text').get()
+        item['ships_from'] = response.css("#fulfillerInfoFeature_feature_div .offer-display-feature-text-message::text")
+        item['sold_by'] = response.css("#merchantInfoFeature_feature_div .offer-display-feature-text-message::text")
+        if mode == 'detached':
+            item = pipeline.process_item(item, None)
+        kept.append(item)
+        del response
+        if page % sample == 0:
+            print(f'{mode} {page} {rss_mb():.1f}', flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=10000)
+    parser.add_argument('--sample', type=int, default=1000)
+    parser.add_argument('--mode', choices=['selectors', 'detached'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run(args.mode, args.pages, args.sample)
+        return
+
+    curves = {}
+    for mode in ('selectors', 'detached'):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--mode', mode, '--pages', str(args.pages), '--sample', str(args.sample)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        curves[mode] = [(int(page), float(rss)) for _, page, rss in (line.split() for line in output.splitlines())]
+
+    print(f'{"pages":>8} {"selectors MB":>14} {"detached MB":>13}')
+    for (page, before), (_, after) in zip(curves['selectors'], curves['detached']):
+        print(f'{page:>8} {before:>14.1f} {after:>13.1f}')
+    growth = {mode: curve[-1][1] - curve[0][1] for mode, curve in curves.items()}
+    print(f'RSS growth over {args.pages} pages: selectors {growth["selectors"]:.1f} MB, detached {growth["detached"]:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
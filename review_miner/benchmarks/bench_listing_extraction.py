@@ -0,0 +1,109 @@
+"""
+CPU per listing page of the product extraction in AmazonSpider.parse: the
+previous per-product CSS queries (template detection, then div[data-asin]
+re-queried and about ten Selector.css() calls per product) versus
+amazon.extraction, which reads each product in one walk of its subtree.
+
+Both sides run on the listing fixtures. 'page' includes building the response
+and parsing the HTML, as in a crawl; 'extract' reuses one parsed response so
+only the extraction itself is timed. Exits non-zero when the two sides do not
+extract the same products.
+
+    cd review_miner && python benchmarks/bench_listing_extraction.py --iterations 200
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+project_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_path)
+
+from scrapy.http import HtmlResponse
+from amazon.extraction import detect_listing_template, listing_products, extract_listing_product
+
+FIXTURES_DIR = os.path.join(project_path, 'benchmarks', 'fixtures')
+URL = 'https://www.amazon.com/s?k=headphones'
+
+
+def legacy_extract(response):
+    """The extraction AmazonSpider.parse did before amazon.extraction, without error logging."""
+    if response.css('.a-section.a-spacing-small > .puisg-row'):
+        product_list = response.css('.a-section.a-spacing-small > .puisg-row')
+    elif response.css('.a-section > .puisg-row'):
+        product_list = response.css('.a-section > .puisg-row')
+    else:
+        product_list = response.css('.puis-card-border')
+    if not product_list:
+        return []
+    products = []
+    for product in response.css('div[data-asin]'):
+        is_sponsored = bool(product.css('div.a-row.a-spacing-micro'))
+        product_url = product.css("h2.a-size-mini a.a-link-normal::attr(href)").get()
+        if not product_url:
+            continue
+        products.append({
+            'product_url': product_url,
+            'product_name': product.css(".a-color-base.a-text-normal::text").get(),
+            'price': product.css(".a-price-whole::text").get(),
+            'ratings': product.css('span.a-icon-alt::text').get(),
+            'reviewcount': product.css('.a-size-base.s-underline-text::text').get(),
+            'product_image': product.css(".s-image::attr(src)").get(),
+            'badges': product.css('.a-badge-region .a-badge-text::text').get(),
+            'deals': product.css('.a-row .s-link-style .a-badge-text::text').get(),
+            'sponsored': is_sponsored,
+        })
+    return products
+
+
+def compiled_extract(response):
+    template, rows = detect_listing_template(response.selector.root)
+    products = []
+    for product in listing_products(rows):
+        values = extract_listing_product(template, product)
+        if values['product_url']:
+            products.append(values)
+    return products
+
+
+def cpu_per_page(extract, body, iterations, fresh):
+    response = HtmlResponse(url=URL, body=body, encoding='utf-8')
+    count = len(extract(response))
+    start = time.process_time()
+    for _ in range(iterations):
+        if fresh:
+            response = HtmlResponse(url=URL, body=body, encoding='utf-8')
+        extract(response)
+    return (time.process_time() - start) / iterations, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(FIXTURES_DIR, 'listing_*.html')))
+    if not paths:
+        sys.exit(f'No listing fixtures in {FIXTURES_DIR}; run benchmarks/make_fixtures.py first')
+
+    mismatches = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            body = f.read()
+        name = os.path.splitext(os.path.basename(path))[0]
+        response = HtmlResponse(url=URL, body=body, encoding='utf-8')
+        if legacy_extract(response) != compiled_extract(response):
+            mismatches.append(name)
+        for label, fresh in (('page', True), ('extract', False)):
+            legacy, legacy_count = cpu_per_page(legacy_extract, body, args.iterations, fresh)
+            compiled, compiled_count = cpu_per_page(compiled_extract, body, args.iterations, fresh)
+            print(f'{name:>34} {label:>7}: legacy {legacy * 1000:7.2f} ms  compiled {compiled * 1000:7.2f} ms  '
+                  f'x{legacy / compiled:5.1f}  products {legacy_count}/{compiled_count}')
+
+    if mismatches:
+        sys.exit(f'Extracted products differ from the legacy path on: {", ".join(mismatches)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+Offline throughput of the spider parse callbacks: every HTML fixture in
+benchmarks/fixtures is fed to its spider's parse() as an HtmlResponse, with no
+network, proxy or engine involved. Fixture names pick the spider:
+
+    listing_*.html  AmazonSpider.parse (amz_listings)
+    pdp_*.html      AmazonPDPSpider.parse (amz_pdp)
+    offer_*.html    3P seller AmazonSpider.parse (amz_3p)
+
+Each iteration builds a fresh response, so the HTML parse is timed as in a
+crawl. Reports pages/sec, items/sec and peak memory per fixture, and exits
+non-zero when pages/sec falls more than --threshold below the stored
+baseline. Baselines are machine specific: record them with --save-baseline
+on the machine that runs the comparison.
+
+    cd review_miner && python benchmarks/make_fixtures.py
+    cd review_miner && python benchmarks/bench_parsers.py --iterations 200
+"""
+import argparse
+import contextlib
+import glob
+import importlib
+import io
+import json
+import logging
+import os
+import re
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+project_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_path)
+
+from itemadapter import is_item
+from scrapy import Request
+from scrapy.http import HtmlResponse
+from seen_filter import SeenFilter
+
+FIXTURES_DIR = os.path.join(project_path, 'benchmarks', 'fixtures')
+BASELINE_PATH = os.path.join(project_path, 'benchmarks', 'baselines', 'bench_parsers.json')
+
+# Fixture prefix -> (spider module, spider class, meta of the request that fetched the page)
+SPIDERS = {
+    'listing': ('amazon.spiders.listing', 'AmazonSpider', {'page_count': 1}),
+    'pdp': ('amazon.spiders.pdp', 'AmazonPDPSpider', {}),
+    'offer': ('amazon.spiders.3pseller', 'AmazonSpider', {}),
+}
+
+CANONICAL_RE = re.compile(rb'<link rel="canonical" href="([^"]+)"')
+
+
+def load_fixtures(pattern):
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, pattern))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        prefix = name.split('_')[0]
+        if prefix not in SPIDERS:
+            continue
+        with open(path, 'rb') as f:
+            body = f.read()
+        match = CANONICAL_RE.search(body)
+        url = match.group(1).decode() if match else 'https://www.amazon.com/'
+        fixtures.append((name, prefix, url, body))
+    return fixtures
+
+
+def make_spider(prefix):
+    module_name, class_name, _ = SPIDERS[prefix]
+    spider_cls = getattr(importlib.import_module(module_name), class_name)
+    spider = spider_cls(task_id='bench', celery_id='bench')
+    if hasattr(spider, 'seen'):
+        # Benchmarks run without Redis
+        spider.seen = SeenFilter(spider.seen.name, local=True)
+    return spider
+
+
+def make_response(prefix, url, body):
+    meta = {**SPIDERS[prefix][2], 'original_url': url, 'product_url': url, 'start_url': url}
+    return HtmlResponse(url=url, body=body, encoding='utf-8', request=Request(url, meta=meta))
+
+
+def parse_once(spider, prefix, url, body):
+    if hasattr(spider, 'seen'):
+        # Variant requests are only yielded for unseen ids; keep every iteration the same
+        spider.seen.clear()
+        spider.requested_ids.clear()
+    items = 0
+    for result in spider.parse(make_response(prefix, url, body)) or ():
+        if is_item(result):
+            items += 1
+    return items
+
+
+def bench_fixture(name, prefix, url, body, iterations, warmup):
+    spider = make_spider(prefix)
+    for _ in range(warmup):
+        parse_once(spider, prefix, url, body)
+
+    items = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        items += parse_once(spider, prefix, url, body)
+    elapsed = time.perf_counter() - start
+
+    # Memory in a separate pass, tracemalloc would skew the timing
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    parse_once(spider, prefix, url, body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+
+    return {
+        'spider': spider.name,
+        'items_per_page': items / iterations,
+        'pages_per_sec': iterations / elapsed,
+        'items_per_sec': items / elapsed,
+        'peak_python_kb': peak / 1024,
+        'rss_growth_kb': rss_growth,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Names of fixtures whose pages/sec dropped more than `threshold` below the baseline."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        floor = baseline[name]['pages_per_sec'] * (1 - threshold)
+        if result['pages_per_sec'] < floor:
+            regressions.append(name)
+            print(f'REGRESSION {name}: {result["pages_per_sec"]:.1f} pages/s, baseline '
+                  f'{baseline[name]["pages_per_sec"]:.1f} (floor {floor:.1f})')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--fixtures', default='*.html', help='Glob of fixtures to run, e.g. "listing_*.html".')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed pages/sec drop against the baseline.')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline.')
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        sys.exit(f'No fixtures in {FIXTURES_DIR}; run benchmarks/make_fixtures.py first')
+
+    # Spider logging and detect_page_template's print are not what is measured
+    logging.disable(logging.CRITICAL)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        # ErrorManager writes its CSV under ./data
+        os.chdir(workdir)
+        for name, prefix, url, body in fixtures:
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[name] = bench_fixture(name, prefix, url, body, args.iterations, args.warmup)
+            r = results[name]
+            print(f'{name:>36} ({r["spider"]}): {r["pages_per_sec"]:8.1f} pages/s  {r["items_per_sec"]:9.1f} items/s  '
+                  f'{r["items_per_page"]:5.1f} items/page  peak {r["peak_python_kb"]:8.0f} KB  rss +{r["rss_growth_kb"]} KB')
+    os.chdir(project_path)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f'Saved baseline to {args.baseline}')
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}; run with --save-baseline to record one')
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if compare(results, baseline, args.threshold):
+        sys.exit(1)
+    print(f'All fixtures within {args.threshold:.0%} of the baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Pick-up latency of HIGH priority tasks behind a saturated LOW priority queue,
+with the broker priority settings from celeryconfig.
+
+A solo worker drains a queue that already holds --low LOW tasks; --high HIGH
+tasks are sent once it is busy. Each task records how long it waited between
+being sent and starting. With priorities honoured the HIGH tasks start after at
+most one in-flight LOW task; without them they wait for the whole backlog.
+
+Needs the local Redis from config:
+
+    cd review_miner && python benchmarks/bench_priority_latency.py --low 200 --high 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+project_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_path)
+
+import redis
+from celery import Celery
+from celeryconfig import celery as project_celery, task_priorities
+from config import environment
+
+QUEUE = 'bench_priority'
+RESULTS_KEY = 'bench_priority:latencies'
+broker_url = environment['local']['celery-broker']
+
+app = Celery('bench_priority_latency', broker=broker_url)
+app.conf.update(
+    task_serializer='json',
+    accept_content=['json'],
+    broker_transport_options=project_celery.conf.broker_transport_options,
+    worker_prefetch_multiplier=project_celery.conf.worker_prefetch_multiplier,
+    task_default_queue=QUEUE,
+)
+
+
+@app.task(name='bench_priority_latency.work')
+def work(label, sent_at, duration):
+    started_at = time.time()
+    redis.Redis.from_url(broker_url).rpush(RESULTS_KEY, json.dumps([label, started_at - sent_at]))
+    time.sleep(duration)
+
+
+def send(label, count, duration):
+    for _ in range(count):
+        work.apply_async(args=[label, time.time(), duration], priority=task_priorities[label])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--low', type=int, default=200)
+    parser.add_argument('--high', type=int, default=5)
+    parser.add_argument('--duration', type=float, default=0.05, help='Seconds each task works.')
+    args = parser.parse_args()
+
+    client = redis.Redis.from_url(broker_url)
+    client.delete(RESULTS_KEY)
+    app.control.purge()
+
+    send('LOW', args.low, args.duration)
+    worker = subprocess.Popen(
+        [sys.executable, '-m', 'celery', '-A', 'bench_priority_latency', 'worker', '-P', 'solo', '-Q', QUEUE, '--loglevel=warning'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    try:
+        # Let the worker get busy with the LOW backlog before the urgent tasks arrive
+        while client.llen(RESULTS_KEY) < 3:
+            time.sleep(0.05)
+        send('HIGH', args.high, args.duration)
+
+        while client.llen(RESULTS_KEY) < args.low + args.high:
+            time.sleep(0.2)
+    finally:
+        worker.terminate()
+        worker.wait()
+
+    latencies = {'HIGH': [], 'LOW': []}
+    for entry in client.lrange(RESULTS_KEY, 0, -1):
+        label, latency = json.loads(entry)
+        latencies[label].append(latency)
+    for label, values in latencies.items():
+        print(f'{label:>5}: {len(values)} tasks  median wait {statistics.median(values):.3f}s  max wait {max(values):.3f}s')
+
+    backlog_time = args.low * args.duration
+    high_max = max(latencies['HIGH'])
+    print(f'HIGH max wait {high_max:.3f}s vs {backlog_time:.1f}s of LOW backlog: '
+          f'{"priorities honoured" if high_max < backlog_time / 2 else "HIGH tasks waited behind the backlog"}')
+    return 0 if high_max < backlog_time / 2 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Publisher claim throughput against a local Postgres: the old row-at-a-time
+path (select every PENDING row, check start_date/cron_time in Python, one
+UPDATE + commit per due row) versus Publisher.claim_due_tasks (SQL-side due
+filter, FOR UPDATE SKIP LOCKED, one bulk UPDATE ... RETURNING).
+
+Runs against a TEMP task_logger table on the 'local' database from config, so
+nothing in the real table is touched. Publishing to Celery is left out of both
+paths; only the database work is timed.
+
+    cd review_miner && python benchmarks/bench_publisher_claim.py --rows 5000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import psycopg2
+
+project_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_path)
+
+from config import environment
+from tasks import Publisher
+
+SPIDER_NAME = 'amz_pdp'
+
+
+def create_table(conn, rows, due_ratio, now):
+    """TEMP task_logger shadowing the real one for this connection, with rows PENDING tasks."""
+    cursor = conn.cursor()
+    cursor.execute("DROP TABLE IF EXISTS pg_temp.task_logger")
+    cursor.execute("""
+        CREATE TEMP TABLE task_logger (
+            id uuid PRIMARY KEY, task_name text, status text, task_urls jsonb,
+            start_date date, functionality jsonb, celery_task_id text, system_info jsonb
+        )
+    """)
+    past = (now - timedelta(minutes=1)).strftime('%H:%M')
+    future = (now + timedelta(minutes=30)).strftime('%H:%M')
+    due_rows = int(rows * due_ratio)
+    cursor.executemany(
+        "INSERT INTO task_logger (id, task_name, status, task_urls, start_date, functionality) VALUES (%s, %s, 'PENDING', %s, %s, %s)",
+        [
+            (str(uuid.uuid4()), SPIDER_NAME, json.dumps([f'https://www.amazon.com/dp/B0{i:08d}']), now.date(),
+             json.dumps({'cron_time': past if i < due_rows else future}))
+            for i in range(rows)
+        ]
+    )
+    conn.commit()
+    cursor.close()
+    return due_rows
+
+
+def legacy_claim(conn, now):
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, task_urls, start_date, functionality FROM task_logger WHERE status = 'PENDING' AND task_name = %s", (SPIDER_NAME,))
+    claimed = 0
+    for task_id, task_urls, start_date, functionality in cursor.fetchall():
+        if start_date == now.date() and functionality.get('cron_time') <= now.strftime('%H:%M'):
+            cursor.execute(
+                "UPDATE task_logger SET status = %s, celery_task_id = %s WHERE id = %s",
+                ('PUBLISHED', str(uuid.uuid4()), task_id)
+            )
+            conn.commit()
+            claimed += 1
+    cursor.close()
+    return claimed
+
+
+def set_based_claim(conn, now):
+    cursor = conn.cursor()
+    claimed = Publisher().claim_due_tasks(cursor, SPIDER_NAME, now)
+    conn.commit()
+    cursor.close()
+    return len(claimed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--due-ratio', type=float, default=0.5)
+    parser.add_argument('--db', default=environment['local']['db'])
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.db)
+    now = datetime.now()
+    for name, claim in [('legacy', legacy_claim), ('set-based', set_based_claim)]:
+        due_rows = create_table(conn, args.rows, args.due_ratio, now)
+        start = time.perf_counter()
+        claimed = claim(conn, now)
+        elapsed = time.perf_counter() - start
+        print(f'{name:>10}: claimed {claimed}/{due_rows} due of {args.rows} pending rows in {elapsed:.3f}s '
+              f'({claimed / elapsed:.0f} rows/s)')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Per-task wall time of run_spider's execution modes: `scrapy crawl` through a
+shell, a crawl forked from a warm worker process, and a crawl handed to a
+pre-warmed crawler host.
+
+Proxy API keys are blanked so the spider schedules no requests: what is left
+is exactly the per-task overhead (interpreter startup, imports, settings load,
+engine start/stop) that the run mode decides.
+
+    cd review_miner && python benchmarks/bench_run_modes.py --runs 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Blank keys before anything loads .env, so no request is sent through a proxy
+os.environ['SCRAPER_API_KEY'] = ''
+os.environ['SCRAPEOPS_API_KEY'] = ''
+
+project_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_path)
+os.chdir(project_path)
+
+import spider_runner
+from tasks import execute_spider, get_settings_module
+from url_sources import write_url_manifest
+
+
+def time_mode(run_mode, spider_name, url_source, runs, output_dir):
+    timings = []
+    for run in range(runs):
+        filename = os.path.join(output_dir, f'{spider_name}__{run_mode}__{run}.csv')
+        start = time.perf_counter()
+        exit_code = execute_spider(spider_name, url_source, f'bench-{run}', f'bench-{run_mode}', filename,
+                                   spider_name, get_settings_module(spider_name), run_mode=run_mode)
+        timings.append(time.perf_counter() - start)
+        if exit_code != 0:
+            print(f'{run_mode}: run {run} exited with {exit_code}')
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--spider', default='amz_pdp', choices=['amz_listings', 'amz_pdp', 'amz_3p'])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    # The worker preloads spiders once at startup, do the same before timing
+    spider_runner.preload(get_settings_module(args.spider))
+    spider_runner.get_pool(get_settings_module(args.spider))
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        url_source = write_url_manifest(['https://www.amazon.com/dp/B093QLTD9Q'],
+                                        os.path.join(output_dir, 'urls.txt')).reference
+        for run_mode in ['subprocess', 'inprocess', 'pool']:
+            timings = time_mode(run_mode, args.spider, url_source, args.runs, output_dir)
+            print(f'{run_mode:>10}: mean {statistics.mean(timings):.3f}s  '
+                  f'min {min(timings):.3f}s  max {max(timings):.3f}s  ({args.runs} runs)')
+    spider_runner.close_pools()
+
+
+if __name__ == '__main__':
+    main()
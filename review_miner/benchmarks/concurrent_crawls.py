@@ -0,0 +1,176 @@
+"""
+Check that several crawls can share one process and reactor: runs two
+amz_pdp crawls and an amz_listings crawl at once against mock_proxy_server.py
+and verifies that each crawl's ScrapySignals extension kept its own state.
+For every crawl its counters must match its own crawler's stats, it must have
+its own event CSV, and no other crawl's start URLs may appear in that CSV.
+Exits non-zero when a check fails.
+
+Like load_test.py it uses the 'local' environment (Redis for checkpoints,
+rate limits and the seen filter). With --offline it needs no Redis: Redis is
+pointed at a closed port, so checkpoints and the seen filter run on their
+in-memory fallbacks, and the rate limiter and credit ledger are disabled.
+The offline run also checks that each crawl kept its own checkpointed start
+URLs and seen filter.
+
+    cd review_miner && python benchmarks/concurrent_crawls.py --urls 20
+    cd review_miner && python benchmarks/concurrent_crawls.py --urls 20 --offline
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+
+os.environ['APP_ENV'] = os.environ.get('LOADTEST_APP_ENV', 'local')
+
+project_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_path)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_proxy_server import MockProxyServer
+
+
+def start_urls(spider_name, count):
+    # Fresh ASINs and keywords each run, so neither checkpoints nor the seen filter skip them
+    run = random.randrange(10 ** 6)
+    if spider_name == 'amz_listings':
+        return [f'https://www.amazon.com/s?k=concurrent+{run}+{i}' for i in range(count)]
+    return [f'https://www.amazon.com/dp/B{run:06d}{i:03d}' for i in range(count)]
+
+
+def event_rows(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def check_crawl(name, crawler, urls, other_urls, extension_cls):
+    """The crawl's ScrapySignals instance and the messages of its failed checks."""
+    failures = []
+    extension = next(ext for ext in crawler.extensions.middlewares if isinstance(ext, extension_cls))
+    stats = crawler.stats
+    # request_scheduled also fires for requests the dupefilter then drops
+    scheduled = stats.get_value('scheduler/enqueued', 0) + stats.get_value('dupefilter/filtered', 0)
+    if extension.total_urls != scheduled:
+        failures.append(f'{name}: {extension.total_urls} requests scheduled, crawler stats say {scheduled}')
+    if extension.scraped_items_count != stats.get_value('item_scraped_count', 0):
+        failures.append(f'{name}: {extension.scraped_items_count} items, crawler stats say {stats.get_value("item_scraped_count", 0)}')
+    if not extension.total_urls:
+        failures.append(f'{name}: nothing was scheduled')
+
+    rows = event_rows(extension.csv_file)
+    logged_urls = {row['Original URL'] for row in rows if row['Original URL']}
+    foreign = logged_urls & other_urls
+    if foreign:
+        failures.append(f'{name}: {len(foreign)} URLs of other crawls in {extension.csv_file}, e.g. {sorted(foreign)[0]}')
+    if not logged_urls & set(urls):
+        failures.append(f'{name}: none of its start URLs in {extension.csv_file}')
+    logged_items = sum(1 for row in rows if row['Log Type'] == 'Item Scraped')
+    if logged_items and logged_items != extension.scraped_items_count:
+        failures.append(f'{name}: {logged_items} items logged, {extension.scraped_items_count} counted')
+
+    print(f'{name:>10}: {extension.total_urls} scheduled, {extension.successful_requests} ok, '
+          f'{extension.failed_requests} failed, {extension.scraped_items_count} items, log {extension.csv_file}')
+    return extension, failures
+
+
+def check_fallbacks(name, crawler, urls, other_urls, middleware_cls, local_filter_cls):
+    """Offline checks: the crawl's checkpoint (buffered in memory) and seen filter are its own."""
+    failures = []
+    middleware = next(mw for mw in crawler.engine.scraper.spidermw.middlewares if isinstance(mw, middleware_cls))
+    done = middleware.checkpoint.pending if middleware.checkpoint else set()
+    if done & other_urls:
+        failures.append(f'{name}: {len(done & other_urls)} start URLs of other crawls checkpointed')
+    if not done & set(urls):
+        failures.append(f'{name}: none of its start URLs checkpointed')
+    if middleware.outstanding:
+        failures.append(f'{name}: {len(middleware.outstanding)} start URLs with requests still outstanding')
+    if not crawler.stats.get_value('item_scraped_count', 0):
+        failures.append(f'{name}: no items scraped')
+
+    seen = getattr(crawler.spider, 'seen', None)
+    if seen is not None and not isinstance(seen.backend, local_filter_cls):
+        failures.append(f'{name}: seen filter did not fall back to {local_filter_cls.__name__}')
+    print(f'{name:>10}: {len(done)} start URLs checkpointed in memory'
+          + (f', seen filter {type(seen.backend).__name__}' if seen is not None else ''))
+    return middleware, seen, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--urls', type=int, default=20, help='Start URLs per crawl.')
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--offline', action='store_true', help='Run without Redis, on the in-memory fallbacks.')
+    args = parser.parse_args()
+
+    if args.offline:
+        # Read when checkpoints and seen filters connect, so every Redis call fails fast and falls back
+        from config import environment, app_env
+        environment[app_env]['redis'] = 'redis://127.0.0.1:1/0'
+
+    mock = MockProxyServer(('127.0.0.1', 0), args.latency, 0.5, seed=1).start()
+    os.environ.update({
+        'SCRAPERAPI_BASE_URL': f'{mock.base_url}/scraperapi/',
+        'SCRAPEOPS_BASE_URL': f'{mock.base_url}/scrapeops/v1/',
+        'SCRAPER_API_KEY': 'concurrent',
+        'SCRAPEOPS_API_KEY': 'concurrent',
+        'SCRAPY_SETTINGS_MODULE': 'amazon.settings',
+    })
+    os.chdir(project_path)
+
+    # Imported once the environment points the providers at the mock
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+    from scrapermanagement import ScrapySignals
+    from amazon.middlewares import CheckpointSpiderMiddleware
+    from seen_filter import LocalBloomFilter
+
+    settings = get_project_settings()
+    settings.set('PROXY_MODE', 'api')
+    settings.set('LOG_LEVEL', 'WARNING')
+    if args.offline:
+        settings.set('PROXY_RATE_LIMITS', {})
+        settings.set('DOWNLOADER_MIDDLEWARES', {
+            **settings.getdict('DOWNLOADER_MIDDLEWARES'), 'amazon.middlewares.ProxyCreditMiddleware': None,
+        })
+    process = CrawlerProcess(settings)
+
+    crawls = []
+    for name, spider_name in (('pdp-a', 'amz_pdp'), ('pdp-b', 'amz_pdp'), ('listings', 'amz_listings')):
+        urls = start_urls(spider_name, args.urls)
+        crawler = process.create_crawler(spider_name)
+        process.crawl(crawler, urls=','.join(urls), task_id=f'concurrent-{name}-{random.randrange(10 ** 9)}', celery_id=name)
+        crawls.append((name, crawler, urls))
+    try:
+        process.start()
+    finally:
+        mock.stop()
+
+    failures = []
+    extensions = []
+    fallbacks = []
+    for name, crawler, urls in crawls:
+        other_urls = {url for other, _, other_start in crawls if other != name for url in other_start}
+        extension, crawl_failures = check_crawl(name, crawler, urls, other_urls, ScrapySignals)
+        extensions.append(extension)
+        failures.extend(crawl_failures)
+        if args.offline:
+            middleware, seen, crawl_failures = check_fallbacks(name, crawler, urls, other_urls, CheckpointSpiderMiddleware, LocalBloomFilter)
+            fallbacks.append((middleware, seen))
+            failures.extend(crawl_failures)
+    if len({id(ext) for ext in extensions}) != len(extensions) or len({ext.csv_file for ext in extensions}) != len(extensions):
+        failures.append('crawls shared a ScrapySignals instance or event log')
+    if len({id(middleware.checkpoint) for middleware, _ in fallbacks}) != len(fallbacks):
+        failures.append('crawls shared a checkpoint')
+    seen_filters = [seen.backend for _, seen in fallbacks if seen is not None]
+    if len({id(backend) for backend in seen_filters}) != len(seen_filters):
+        failures.append('crawls shared a seen filter')
+
+    for failure in failures:
+        print(f'FAIL {failure}')
+    print('FAIL' if failures else 'OK: every crawl kept its own ScrapySignals state')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
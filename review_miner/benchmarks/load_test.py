@@ -0,0 +1,178 @@
+"""
+End-to-end load test of Publisher -> Celery -> run_spider -> spider -> CSV
+against mock_proxy_server.py, so no network or proxy credits are used.
+
+Inserts --tasks PENDING task_logger rows (due now) on the 'local' database,
+starts the mock server and a Celery worker on the local Redis broker with the
+providers pointed at the mock, publishes through Publisher.publish_task and
+waits for every row to reach COMPLETED or FAILED. Reports tasks/min, the
+request latency distribution and outcome mix seen by the mock, how many
+targets were fetched again (retries, provider failover) and final task states.
+
+Run it against a development database: other PENDING rows of the spider that
+are due today are published along with the load-test rows.
+
+    cd review_miner && python benchmarks/load_test.py --tasks 50 --urls-per-task 20 --concurrency 4 \\
+        --latency 0.5 --error-rate 0.02 --rate-limit-rate 0.05 --captcha-rate 0.02
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from urllib.request import urlopen
+
+# Everything this process and the worker touch goes to the local database and Redis
+os.environ['APP_ENV'] = os.environ.get('LOADTEST_APP_ENV', 'local')
+
+project_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_path)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tasks import Publisher
+from db import db_connection
+from mock_proxy_server import MockProxyServer
+from seen_filter import SeenFilter
+
+TERMINAL_STATUSES = {'COMPLETED', 'FAILED'}
+
+
+def target_urls(spider_name, count, offset):
+    if spider_name == 'amz_listings':
+        return [f'https://www.amazon.com/s?k=loadtest+{offset + i}' for i in range(count)]
+    return [f'https://www.amazon.com/dp/B0{offset + i:08d}' for i in range(count)]
+
+
+def insert_tasks(spider_name, tasks, urls_per_task, priority):
+    now = datetime.now()
+    rows = [
+        (str(uuid.uuid4()), spider_name, json.dumps(target_urls(spider_name, urls_per_task, n * urls_per_task)), now.date(),
+         json.dumps({'cron_time': now.strftime('%H:%M'), 'priority': priority, 'loadtest': True}))
+        for n in range(tasks)
+    ]
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO task_logger (id, task_name, status, task_urls, start_date, functionality) VALUES (%s, %s, 'PENDING', %s, %s, %s)",
+                rows
+            )
+    return [row[0] for row in rows]
+
+
+def task_statuses(task_ids):
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id::text, status FROM task_logger WHERE id::text = ANY(%s)", (task_ids,))
+            return dict(cursor.fetchall())
+
+
+def delete_tasks(task_ids):
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM task_logger WHERE id::text = ANY(%s)", (task_ids,))
+
+
+def start_worker(mock_url, args):
+    env = {
+        **os.environ,
+        'SCRAPERAPI_BASE_URL': f'{mock_url}/scraperapi/',
+        'SCRAPEOPS_BASE_URL': f'{mock_url}/scrapeops/v1/',
+        'SCRAPER_API_KEY': 'loadtest',
+        'SCRAPEOPS_API_KEY': 'loadtest',
+        'PROXY_MODE': 'api',
+        'SPIDER_RUN_MODE': args.run_mode,
+        # Retries in seconds rather than minutes, so failure handling shows up within the run
+        'SPIDER_RETRY_DELAY': '1',
+        'DAILY_CREDIT_BUDGET': '0',
+    }
+    return subprocess.Popen(
+        [sys.executable, '-m', 'celery', '-A', 'tasks.celery', 'worker', '-Q', 'amazon',
+         '-c', str(args.concurrency), '--loglevel=warning'],
+        cwd=project_path, env=env,
+    )
+
+
+def wait_for_tasks(task_ids, timeout, started):
+    """Seconds from `started` at which each task reached a terminal status, and the last statuses seen."""
+    finished_at = {}
+    statuses = {}
+    while time.monotonic() - started < timeout:
+        statuses = task_statuses(task_ids)
+        for task_id, status in statuses.items():
+            if status in TERMINAL_STATUSES and task_id not in finished_at:
+                finished_at[task_id] = time.monotonic() - started
+        if len(finished_at) == len(task_ids):
+            break
+        time.sleep(0.5)
+    return finished_at, statuses
+
+
+def report(args, finished_at, statuses, mock_stats):
+    print(f'\n{args.tasks} {args.spider} tasks x {args.urls_per_task} URLs, worker concurrency {args.concurrency}, '
+          f'run mode {args.run_mode}')
+    print(f'Final task states: {dict(Counter(statuses.values()))}')
+    if finished_at:
+        elapsed = max(finished_at.values())
+        print(f'Finished {len(finished_at)} tasks in {elapsed:.1f}s: {len(finished_at) / elapsed * 60:.1f} tasks/min')
+    unfinished = len(args.task_ids) - len(finished_at)
+    if unfinished:
+        print(f'{unfinished} tasks did not finish within {args.timeout}s')
+
+    latency = mock_stats['latency']
+    print(f'Proxy requests served: {mock_stats["requests"]} (max {mock_stats["max_in_flight"]} in flight), '
+          f'{mock_stats["requests"] / max(finished_at.values() or [1]):.1f} req/s')
+    if latency['p50'] is not None:
+        print('Request latency: ' + '  '.join(f'{name} {value * 1000:.0f} ms' for name, value in latency.items()))
+    print(f'Outcomes: {mock_stats["outcomes"]}')
+    print(f'Targets fetched more than once (retries, failover): {mock_stats["repeated_targets"]} of {mock_stats["distinct_targets"]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--spider', default='amz_pdp', choices=['amz_pdp', 'amz_listings', 'amz_3p'])
+    parser.add_argument('--tasks', type=int, default=20)
+    parser.add_argument('--urls-per-task', type=int, default=10)
+    parser.add_argument('--priority', default='NORMAL', choices=['HIGH', 'NORMAL', 'LOW'])
+    parser.add_argument('--concurrency', type=int, default=2, help='Celery worker processes.')
+    parser.add_argument('--run-mode', default='inprocess', choices=['subprocess', 'inprocess', 'pool'])
+    parser.add_argument('--port', type=int, default=0, help='Mock server port, 0 for any free port.')
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--latency-jitter', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--captcha-rate', type=float, default=0.0)
+    parser.add_argument('--timeout', type=float, default=1800)
+    parser.add_argument('--keep-rows', action='store_true', help='Leave the load-test task_logger rows in place.')
+    args = parser.parse_args()
+
+    mock = MockProxyServer(('127.0.0.1', args.port), args.latency, args.latency_jitter, args.error_rate,
+                           args.rate_limit_rate, args.captcha_rate).start()
+    print(f'Mock proxy on {mock.base_url}')
+
+    # The load-test ASINs are the same on every run; forget the ones an earlier run scraped
+    SeenFilter('pdp_asin').clear()
+    args.task_ids = insert_tasks(args.spider, args.tasks, args.urls_per_task, args.priority)
+    worker = start_worker(mock.base_url, args)
+    try:
+        # Give the worker time to boot and preload the spiders before the clock starts
+        time.sleep(5)
+        started = time.monotonic()
+        # task_logger rows are named after the spider they run, the task type is the spider too
+        Publisher().publish_task(args.spider, args.spider, args.priority)
+        finished_at, statuses = wait_for_tasks(args.task_ids, args.timeout, started)
+        mock_stats = json.loads(urlopen(f'{mock.base_url}/__stats').read())
+        report(args, finished_at, statuses, mock_stats)
+    finally:
+        worker.terminate()
+        worker.wait()
+        mock.stop()
+        if not args.keep_rows:
+            delete_tasks(args.task_ids)
+
+
+if __name__ == '__main__':
+    main()
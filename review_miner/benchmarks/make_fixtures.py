@@ -0,0 +1,162 @@
+"""
+Writes the synthetic HTML fixtures used by bench_parsers.py: one listing page
+per template detect_page_template tells apart, a PDP page and a 3P offer page.
+They carry every element the spiders select, plus navigation/script filler so
+the DOM is closer to the size of a real page. Pages saved from amazon.com can
+be dropped next to them (listing_*.html, pdp_*.html, offer_*.html) and are
+benchmarked the same way.
+
+Output is deterministic, so regenerating does not move the baseline.
+
+    cd review_miner && python benchmarks/make_fixtures.py
+"""
+import os
+import random
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def asin(rng):
+    return 'B0' + ''.join(rng.choice('ABCDEFGHJKLMNPQRSTUVWXYZ0123456789') for _ in range(8))
+
+
+def filler(rng, links=400, script_kb=40):
+    """Header navigation and inline script of roughly the weight of a real page."""
+    nav = ''.join(
+        f'<li class="nav-item"><a class="nav-a" href="/b?node={rng.randint(10**6, 10**9)}">'
+        f'<span class="nav-a-content">Department {i}</span></a></li>'
+        for i in range(links)
+    )
+    script = 'var P={' + ','.join(f'"k{i}":{rng.randint(0, 10**6)}' for i in range(script_kb * 60)) + '};'
+    return f'<script type="text/javascript">{script}</script><div id="nav-main"><ul class="nav-ul">{nav}</ul></div>'
+
+
+def page(title, canonical, head_filler, body):
+    return (
+        f'<!doctype html><html lang="en-us"><head><meta charset="utf-8"><title>{title}</title>'
+        f'<link rel="canonical" href="{canonical}">{head_filler}</head>'
+        f'<body><div id="a-page">{body}</div></body></html>'
+    )
+
+
+def listing_product(rng, wrapper, sponsored):
+    product_asin = asin(rng)
+    price = rng.randint(5, 400)
+    body = (
+        (f'<div class="a-row a-spacing-micro"><span class="puis-label-popover-default">'
+         f'<span class="a-color-secondary">Sponsored</span></span></div>' if sponsored else '')
+        + f'<div class="a-section a-spacing-none puis-padding-right-small s-title-instructions-style">'
+        f'<h2 class="a-size-mini a-spacing-none a-color-base s-line-clamp-2">'
+        f'<a class="a-link-normal s-underline-text s-underline-link-text s-link-style a-text-normal" href="/Product-{product_asin}/dp/{product_asin}/ref=sr_1_1">'
+        f'<span class="a-size-medium a-color-base a-text-normal">Wireless Headphones Model {product_asin} with Noise Cancelling</span></a></h2></div>'
+        f'<div class="a-section a-spacing-none a-spacing-top-micro"><div class="a-row a-size-small">'
+        f'<span aria-label="4.{rng.randint(0, 9)} out of 5 stars"><i class="a-icon a-icon-star-small"><span class="a-icon-alt">4.{rng.randint(0, 9)} out of 5 stars</span></i></span>'
+        f'<span class="a-size-base s-underline-text">{rng.randint(10, 90000):,}</span></div></div>'
+        f'<div class="a-row a-size-base a-color-base"><span class="a-price"><span class="a-offscreen">${price}.99</span>'
+        f'<span class="a-price-whole">{price}<span class="a-price-decimal">.</span></span><span class="a-price-fraction">99</span></span></div>'
+        + (f'<div class="a-badge-region"><span class="a-badge-text">Best Seller</span></div>' if rng.random() < 0.2 else '')
+        + (f'<div class="a-row"><a class="s-link-style"><span class="a-badge-text">Limited time deal</span></a></div>' if rng.random() < 0.2 else '')
+    )
+    image = (f'<div class="s-product-image-container"><img class="s-image" src="https://m.media-amazon.com/images/I/{product_asin}._AC_UY218_.jpg" '
+             f'alt="Wireless Headphones"></div>')
+    if wrapper == 'general':
+        inner = f'<div class="a-section a-spacing-small"><div class="puisg-row">{image}{body}</div></div>'
+    elif wrapper == 'vertical':
+        inner = f'<div class="a-section"><div class="puisg-row">{image}{body}</div></div>'
+    else:
+        inner = f'<div class="puis-card-container puis-card-border"><div class="a-section">{image}{body}</div></div>'
+    return (f'<div data-asin="{product_asin}" data-index="{rng.randint(1, 60)}" data-component-type="s-search-result" '
+            f'class="sg-col-4-of-24 s-result-item s-asin"><div class="sg-col-inner">{inner}</div></div>')
+
+
+def sponsored_blocks(rng):
+    products = ''.join(
+        f'<div data-asin="{asin(rng)}"><a class="a-link-normal" href="/dp/{asin(rng)}">Brand product {i}</a>'
+        f'<img src="https://m.media-amazon.com/images/I/brand{i}.jpg"><span class="a-icon-alt">4.5 out of 5 stars</span>'
+        f'<span data-rt="1">{rng.randint(10, 5000)}</span></div>'
+        for i in range(3)
+    )
+    brand = (f'<div id="CardInstanceSB{rng.randint(1000, 9999)}"><a href="/stores/Acme/page/1">'
+             f'<img alt="Acme" src="https://m.media-amazon.com/images/S/acme-logo.png">'
+             f'<span class="a-truncate-full">Sound that moves you</span></a>{products}</div>')
+    video = ('<span class="sbv-video-single-product">'
+             '<h2 class="a-size-mini a-spacing-none a-color-base s-line-clamp-3"><a><span>Acme Studio Headphones</span></a></h2>'
+             '<span class="a-size-base s-underline-text">2,345</span>'
+             '<i class="a-icon-star-small"><span class="a-icon-alt">4.6 out of 5 stars</span></i>'
+             '<span class="a-price"><span class="a-offscreen">$129.99</span></span>'
+             '<img class="s-image" src="https://m.media-amazon.com/images/I/video.jpg">'
+             '<a class="a-link-normal" href="/dp/B0VIDEO001">Shop</a><video src="https://m.media-amazon.com/video.mp4"></video></span>')
+    return brand + video
+
+
+def listing_page(rng, wrapper, products):
+    results = ''.join(listing_product(rng, wrapper, sponsored=i % 6 == 0) for i in range(products))
+    pagination = ('<span class="s-pagination-strip"><span class="s-pagination-item s-pagination-selected">1</span>'
+                  '<a class="s-pagination-item s-pagination-button" href="/s?k=headphones&amp;page=2">2</a></span>')
+    body = f'<div class="s-main-slot s-result-list s-search-results">{sponsored_blocks(rng)}{results}{pagination}</div>'
+    return page('Amazon.com : headphones', 'https://www.amazon.com/s?k=headphones', filler(rng), body)
+
+
+def pdp_page(rng):
+    product_asin = 'B093QLTD9Q'
+    variants = ''.join(f'<li data-csa-c-item-id="{v}" class="swatch-list-item"><span>Color {i}</span></li>'
+                       for i, v in enumerate([product_asin] + [asin(rng) for _ in range(11)]))
+    details = ''.join(f'<li><span class="a-list-item"><span class="a-text-bold">Detail {i} :</span><span>Value {i}</span></span></li>'
+                      for i in range(12))
+    bullets = ''.join(f'<li><span class="a-list-item">Feature bullet {i} describing the product in some detail.</span></li>' for i in range(7))
+    overview = ''.join(f'<tr><td class="a-span3"><span class="a-text-bold">Attribute {i}</span></td>'
+                       f'<td class="a-span9"><span class="po-break-word">Value {i}</span></td></tr>' for i in range(8))
+    images = ''.join(f'<li class="a-spacing-small item"><img src="https://m.media-amazon.com/images/I/img{i}._AC_US40_.jpg"></li>' for i in range(7))
+    body = (
+        f'<div id="dp"><div id="centerCol"><h1 id="title"><span id="productTitle">  Acme Wireless Headphones {product_asin}  </span></h1>'
+        f'<a id="bylineInfo" href="/stores/Acme">Visit the Acme Store</a>'
+        f'<i class="a-icon a-icon-star a-star-4-5"><span class="a-icon-alt">4.5 out of 5 stars</span></i>'
+        f'<span class="a-price"><span class="a-offscreen">$129.99</span></span>'
+        f'<ul class="a-unordered-list">{variants}</ul>'
+        f'<div id="feature-bullets"><ul class="a-unordered-list">{bullets}</ul></div>'
+        f'<div id="productOverview_feature_div"><table>{overview}</table></div></div>'
+        f'<div id="altImages"><ul class="a-unordered-list regularAltImageViewLayout">{images}</ul></div>'
+        f'{offer_display(product_asin)}'
+        f'<div id="fulfillerInfoFeature_feature_div"><span class="offer-display-feature-text-message">Amazon</span></div>'
+        f'<div id="merchantInfoFeature_feature_div"><span class="offer-display-feature-text-message">Acme Direct</span></div>'
+        f'<div id="productDescription"><p><span>A long product description paragraph. </span><span>Second part.</span></p></div>'
+        f'<div id="detailBullets_feature_div"><ul>{details}</ul></div></div>'
+    )
+    return page('Amazon.com: Acme Wireless Headphones', f'https://www.amazon.com/dp/{product_asin}', filler(rng), body)
+
+
+def offer_display(product_asin):
+    """Offer box of a product page, what the 3P seller spider reads."""
+    messages = ''.join(f'<div class="offer-display-feature"><span class="offer-display-feature-text-message"> {text} </span></div>'
+                       for text in ['Amazon', 'Acme Direct', 'Returnable until Jan 31, 2025', 'Amazon'])
+    return f'<div id="offerDisplayFeatures_desktop" data-csa-c-asin="{product_asin}">{messages}</div>'
+
+
+def offer_page(rng):
+    product_asin = 'B0DCNQM1PY'
+    body = offer_display(product_asin)
+    return page('Amazon.com: Acme Product', f'https://www.amazon.com/dp/{product_asin}', filler(rng), body)
+
+
+def main():
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    rng = random.Random(42)
+    fixtures = {
+        # detect_page_template: fewer than 5 '.a-section.a-spacing-small > .puisg-row' rows
+        'listing_template1_general.html': listing_page(rng, 'general', 4),
+        'listing_template2_horizontal.html': listing_page(rng, 'general', 48),
+        # '.a-section > .puisg-row' rows only
+        'listing_template3_vertical.html': listing_page(rng, 'vertical', 48),
+        # '.puis-card-border' fallback
+        'listing_template4_cards.html': listing_page(rng, 'cards', 48),
+        'pdp_product.html': pdp_page(rng),
+        'offer_3p.html': offer_page(rng),
+    }
+    for name, html in fixtures.items():
+        with open(os.path.join(FIXTURES_DIR, name), 'w', encoding='utf-8') as f:
+            f.write(html)
+        print(f'{name}: {len(html) / 1024:.0f} KB')
+
+
+if __name__ == '__main__':
+    main()
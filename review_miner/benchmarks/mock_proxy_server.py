@@ -0,0 +1,217 @@
+"""
+Local stand-in for ScraperAPI/ScrapeOps and Amazon, for load tests without the
+network or paid credits. Answers the providers' API interface
+(GET /<anything>?url=<target>&api_key=...) and plain proxy requests for http://
+targets, serving the fixtures in benchmarks/fixtures:
+
+    /s?..., /b?...   listing_*.html, in turn
+    /dp/<asin>       pdp_*.html
+    /gp/offer...     offer_*.html
+
+Latency, 5xx error rate, 429 rate and captcha rate are configurable. Served
+outcomes and handling times are kept per run and returned as JSON from
+/__stats (reset with /__reset).
+
+Point the providers at it through the environment of the crawl:
+
+    SCRAPERAPI_BASE_URL=http://127.0.0.1:8099/scraperapi/
+    SCRAPEOPS_BASE_URL=http://127.0.0.1:8099/scrapeops/v1/
+    PROXY_MODE=api
+
+    cd review_miner && python benchmarks/mock_proxy_server.py --latency 0.8 --error-rate 0.02 --rate-limit-rate 0.05
+"""
+import argparse
+import glob
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+CAPTCHA_PAGE = (b'<html><head><title>Amazon.com</title></head><body>'
+                b'<form method="get" action="/errors/validateCaptcha"><input type="hidden" name="amzn" value="x">'
+                b'<h4>Enter the characters you see below</h4></form></body></html>')
+
+
+class MockStats:
+    """Outcome counts and handling times of the requests served since the last reset."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.outcomes = Counter()
+            self.targets = Counter()
+            self.latencies = []
+            self.in_flight = 0
+            self.max_in_flight = 0
+
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def end(self, outcome, target, latency):
+        with self.lock:
+            self.in_flight -= 1
+            self.outcomes[outcome] += 1
+            self.targets[target] += 1
+            self.latencies.append(latency)
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            return {
+                'requests': len(latencies),
+                'outcomes': dict(self.outcomes),
+                'distinct_targets': len(self.targets),
+                # Targets fetched more than once: retries and provider failovers
+                'repeated_targets': sum(1 for count in self.targets.values() if count > 1),
+                'max_in_flight': self.max_in_flight,
+                'latency': {
+                    f'p{p}': latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] if latencies else None
+                    for p in (50, 90, 95, 99)
+                } | {'max': latencies[-1] if latencies else None},
+            }
+
+
+class MockProxyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.5, latency_jitter=0.5, error_rate=0.0, rate_limit_rate=0.0,
+                 captcha_rate=0.0, fixtures_dir=FIXTURES_DIR, seed=None):
+        super().__init__(address, MockProxyHandler)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.captcha_rate = captcha_rate
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.stats = MockStats()
+        self.pages = {}
+        for kind in ('listing', 'pdp', 'offer'):
+            bodies = []
+            for path in sorted(glob.glob(os.path.join(fixtures_dir, f'{kind}_*.html'))):
+                with open(path, 'rb') as f:
+                    bodies.append(f.read())
+            if not bodies:
+                raise SystemExit(f'No {kind}_*.html fixtures in {fixtures_dir}; run benchmarks/make_fixtures.py first')
+            self.pages[kind] = itertools.cycle(bodies)
+        self.pages_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def draw(self):
+        """(delay, outcome) for one request, outcome being ok, error, rate_limited or captcha."""
+        with self.rng_lock:
+            delay = max(0.0, self.latency + self.rng.uniform(-self.latency_jitter, self.latency_jitter) * self.latency)
+            roll = self.rng.random()
+        for outcome, rate in (('error', self.error_rate), ('rate_limited', self.rate_limit_rate), ('captcha', self.captcha_rate)):
+            if roll < rate:
+                return delay, outcome
+            roll -= rate
+        return delay, 'ok'
+
+    def page_for(self, target):
+        path = urlsplit(target).path
+        if path.startswith('/dp/') or '/dp/' in path:
+            kind = 'pdp'
+        elif path.startswith('/gp/offer'):
+            kind = 'offer'
+        else:
+            kind = 'listing'
+        with self.pages_lock:
+            return next(self.pages[kind])
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class MockProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type='text/html; charset=utf-8'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        if self.path.startswith('/__stats'):
+            return self.send_body(200, json.dumps(server.stats.snapshot()).encode(), 'application/json')
+        if self.path.startswith('/__reset'):
+            server.stats.reset()
+            return self.send_body(200, b'{}', 'application/json')
+
+        if self.path.startswith('http://'):
+            # Proxy-port request for an http:// target
+            target = self.path
+        else:
+            target = parse_qs(urlsplit(self.path).query).get('url', [None])[0]
+            if not target or not parse_qs(urlsplit(self.path).query).get('api_key'):
+                return self.send_body(401, b'Missing url or api_key', 'text/plain')
+
+        started = time.monotonic()
+        server.stats.begin()
+        delay, outcome = server.draw()
+        time.sleep(delay)
+        try:
+            if outcome == 'error':
+                self.send_body(500, b'Request failed. You will not be charged for this request.', 'text/plain')
+            elif outcome == 'rate_limited':
+                self.send_body(429, b'Too many concurrent requests.', 'text/plain')
+            elif outcome == 'captcha':
+                self.send_body(200, CAPTCHA_PAGE)
+            else:
+                self.send_body(200, server.page_for(target))
+        finally:
+            server.stats.end(outcome, target, time.monotonic() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.5, help='Mean seconds before answering.')
+    parser.add_argument('--latency-jitter', type=float, default=0.5, help='Uniform jitter as a fraction of the latency.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with a 500.')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Share of requests answered with a 429.')
+    parser.add_argument('--captcha-rate', type=float, default=0.0, help='Share of requests answered with a captcha page.')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    server = MockProxyServer((args.host, args.port), args.latency, args.latency_jitter, args.error_rate,
+                             args.rate_limit_rate, args.captcha_rate, seed=args.seed)
+    print(f'Mock proxy listening on {server.base_url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats.snapshot(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
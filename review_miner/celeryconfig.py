@@ -1,10 +1,14 @@
 from celery import Celery
+from datetime import timedelta
 from celery.schedules import crontab
 from kombu import Queue, Exchange
-import tasks
-from config import environment
+from config import environment, app_env, beat_poll_minutes
+
+env = environment[app_env]
+
+# Priority names used by beat/task_logger mapped to Redis broker priority levels (0 is consumed first)
+task_priorities = {'HIGH': 0, 'NORMAL': 5, 'LOW': 9}
 
-env = environment['server']
 celery = Celery('tasks', broker=env['celery-broker'])
 
 celery.conf.update(
@@ -16,6 +20,13 @@ celery.conf.update(
     timezone='Asia/Kolkata',
     enable_utc=True,
     broker_connection_retry_on_startup=True,
+    # Loaded by the worker once the app is configured; importing tasks here would be circular (tasks imports this module)
+    imports=('tasks',),
+    # One Redis list per priority level for each queue; workers always pop the highest level first
+    broker_transport_options={'priority_steps': list(range(10)), 'sep': ':', 'queue_order_strategy': 'priority'},
+    task_default_priority=task_priorities['NORMAL'],
+    # Reserve one task at a time so a queued HIGH task is never stuck behind prefetched LOW ones
+    worker_prefetch_multiplier=1,
     task_queues=[
             Queue('amazon', Exchange('amazon'),
                   routing_key='amazon'),
@@ -27,27 +38,34 @@ celery.conf.update(
 # Explicitly register tasks
 celery.autodiscover_tasks(['tasks'])
 
-def update_beat_schedule():
-    tasks_info = [
-        # ('amz_browsenodes', 'amz_browsenodes', 'amazon'),
-        ('amazon_pdp', 'amz_pdp', 'amazon'),
-        ('amz_listings', 'amz_listings', 'amazon'),
-        ('cvs_listings', 'cvs_listings', 'cvs'),
-        ('cvs_pdp', 'cvs_pdp', 'cvs'),
-        # ('wmt_listings', 'wmt_listings', 'walmart'),
-        # ('wmt_browsenodes', 'wmt_browsenodes', 'walmart'),
-        # ('walmart_spider', 'wmt_pdp', 'walmart'),
-        # ('amazon_spider', 'amz_reviews', 'amazon'),
-        # ('walmart_spider', 'wmt_reviews', 'walmart')
-    ]
+# (task_logger task_name, task type, queue, default priority) published by beat and by the dispatcher service.
+# Bulk PDP refreshes run at LOW so listing checks are not stuck behind them; a row can override
+# its priority with functionality['priority']
+beat_tasks_info = [
+    # ('amz_browsenodes', 'amz_browsenodes', 'amazon', 'HIGH'),
+    ('amazon_pdp', 'amz_pdp', 'amazon', 'LOW'),
+    ('amz_listings', 'amz_listings', 'amazon', 'HIGH'),
+    ('cvs_listings', 'cvs_listings', 'cvs', 'HIGH'),
+    ('cvs_pdp', 'cvs_pdp', 'cvs', 'LOW'),
+    # ('wmt_listings', 'wmt_listings', 'walmart'),
+    # ('wmt_browsenodes', 'wmt_browsenodes', 'walmart'),
+    # ('walmart_spider', 'wmt_pdp', 'walmart'),
+    # ('amazon_spider', 'amz_reviews', 'amazon'),
+    # ('walmart_spider', 'wmt_reviews', 'walmart')
+]
 
+def update_beat_schedule():
     schedules = {}
-    for spider_name, task_name, queue_name in tasks_info:
+    # New and rescheduled rows are published by the dispatcher service (LISTEN/NOTIFY),
+    # this poll is only the safety net for anything it missed
+    for spider_name, task_name, queue_name, priority in beat_tasks_info:
         schedules[task_name] = {
             'task': 'tasks.publish_scraper_task',
-            'schedule': crontab(minute='*/5'),  # Every  5 minute
-            'args': (spider_name, task_name, 'HIGH'),
-            'options': {'queue': queue_name}
+            # An interval rather than crontab(minute='*/N'), which is only valid for N up to 59
+            'schedule': timedelta(minutes=beat_poll_minutes),
+            'args': (spider_name, task_name, priority),
+            # The publisher itself must not wait behind queued crawls
+            'options': {'queue': queue_name, 'priority': task_priorities['HIGH']}
         } 
     
     # for spider_name, task_name, queue_name in tasks_info:
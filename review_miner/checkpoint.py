@@ -0,0 +1,147 @@
+import logging
+import redis
+from config import environment, app_env, checkpoint_ttl_days
+
+env = environment[app_env]
+
+
+class CheckpointStore:
+    """
+    Per-task record of finished start URLs and of the task's output file(s),
+    kept in Redis so a retried or resumed task only crawls what is left and
+    appends to the same output. Completions are buffered and written in
+    batches to keep Redis round trips off the per-item path.
+    """
+
+    def __init__(self, task_id, redis_url=None, flush_every=100):
+        self.task_id = task_id
+        self.client = redis.Redis.from_url(redis_url or env['redis'], decode_responses=True)
+        self.ttl = checkpoint_ttl_days * 24 * 3600
+        self.flush_every = flush_every
+        self.pending = set()
+        self.done = None
+
+    @property
+    def done_key(self):
+        return f'checkpoint:{self.task_id}:done'
+
+    def output_key(self, part=None):
+        return f'checkpoint:{self.task_id}:output' + (f':{part}' if part is not None else '')
+
+    def mark_done(self, url):
+        if not url:
+            return
+        self.pending.add(url)
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        try:
+            pipe = self.client.pipeline()
+            pipe.sadd(self.done_key, *self.pending)
+            pipe.expire(self.done_key, self.ttl)
+            pipe.execute()
+            self.pending.clear()
+        except redis.RedisError as e:
+            # Keep the URLs buffered, the next flush retries them
+            logging.error(f"Failed to write checkpoint for task {self.task_id}: {e}")
+
+    def load_done(self):
+        if self.done is None:
+            try:
+                self.done = self.client.smembers(self.done_key)
+            except redis.RedisError as e:
+                logging.error(f"Failed to read checkpoint for task {self.task_id}, crawling every URL: {e}")
+                self.done = set()
+        return self.done
+
+    def forget_done(self, urls=None, batch_size=1000):
+        """Un-finish `urls` (every URL of the task when None), so the next run crawls them again."""
+        self.pending.clear()
+        self.done = None
+        if urls is None:
+            self.client.delete(self.done_key)
+            return
+        batch = []
+        for url in urls:
+            batch.append(url)
+            if len(batch) >= batch_size:
+                self.client.srem(self.done_key, *batch)
+                batch = []
+        if batch:
+            self.client.srem(self.done_key, *batch)
+
+    def pending_urls(self, urls):
+        """Lazily skip URLs an earlier run of this task already finished."""
+        done = self.load_done()
+        if done:
+            logging.info(f"Resuming task {self.task_id}: {len(done)} URLs already finished")
+        skipped = 0
+        for url in urls:
+            if url in done:
+                skipped += 1
+                continue
+            yield url
+        if skipped:
+            logging.info(f"Skipped {skipped} finished URLs for task {self.task_id}")
+
+    def errors_key(self, run_id):
+        return f'checkpoint:{self.task_id}:errors:{run_id}'
+
+    def add_error_counts(self, counts, run_id):
+        """
+        Add a crawl's error counts per error code to its run (the Celery id of
+        run_spider or of a shard). Retries keep the Celery id and reset its
+        counts when they start, so a run only counts its latest attempt.
+        """
+        if not counts:
+            return
+        try:
+            pipe = self.client.pipeline()
+            for code, count in counts.items():
+                pipe.hincrby(self.errors_key(run_id), code, count)
+            pipe.expire(self.errors_key(run_id), self.ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            logging.error(f"Failed to record error counts for task {self.task_id}: {e}")
+
+    def reset_error_counts(self, run_id):
+        """Forget the counts of a run's earlier attempts, before it starts again."""
+        try:
+            self.client.delete(self.errors_key(run_id))
+        except redis.RedisError as e:
+            logging.error(f"Failed to reset error counts for task {self.task_id}: {e}")
+
+    def error_counts(self, run_ids):
+        """{error code: occurrences} summed over the latest attempt of each run."""
+        counts = {}
+        try:
+            pipe = self.client.pipeline()
+            for run_id in run_ids:
+                pipe.hgetall(self.errors_key(run_id))
+            for run_counts in pipe.execute():
+                for code, count in run_counts.items():
+                    counts[int(code)] = counts.get(int(code), 0) + int(count)
+        except redis.RedisError as e:
+            logging.error(f"Failed to read error counts for task {self.task_id}: {e}")
+            return {}
+        return counts
+
+    def get_output(self, part=None):
+        return self.client.get(self.output_key(part))
+
+    def set_output(self, path, part=None):
+        self.client.set(self.output_key(part), path, ex=self.ttl)
+
+    def clear(self, run_ids=(), parts=()):
+        """
+        Forget the task once it has completed: its done set, its output (one
+        per shard in `parts`) and the error counts of `run_ids`, in one DEL.
+        """
+        self.pending.clear()
+        keys = [self.done_key, self.output_key()]
+        keys += [self.output_key(part) for part in parts]
+        keys += [self.errors_key(run_id) for run_id in run_ids]
+        self.client.delete(*keys)
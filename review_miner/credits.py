@@ -0,0 +1,210 @@
+import argparse
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+import redis
+from config import environment, app_env, daily_credit_budget, credit_budget_soft_ratio
+from db import db_connection
+
+env = environment[app_env]
+
+TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS proxy_credit_usage (
+    task_id text NOT NULL,
+    celery_task_id text,
+    spider_name text NOT NULL,
+    provider text NOT NULL,
+    usage_date date NOT NULL,
+    requests integer NOT NULL DEFAULT 0,
+    billed_requests integer NOT NULL DEFAULT 0,
+    credits numeric NOT NULL DEFAULT 0,
+    items integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (task_id, spider_name, provider, usage_date)
+);
+"""
+
+# A retried task adds to the same row instead of replacing it
+UPSERT_SQL = """
+    INSERT INTO proxy_credit_usage (task_id, celery_task_id, spider_name, provider, usage_date, requests, billed_requests, credits, items)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (task_id, spider_name, provider, usage_date) DO UPDATE SET
+        celery_task_id = EXCLUDED.celery_task_id,
+        requests = proxy_credit_usage.requests + EXCLUDED.requests,
+        billed_requests = proxy_credit_usage.billed_requests + EXCLUDED.billed_requests,
+        credits = proxy_credit_usage.credits + EXCLUDED.credits,
+        items = proxy_credit_usage.items + EXCLUDED.items
+"""
+
+REPORT_SQL = """
+    SELECT {group_by}, SUM(requests), SUM(billed_requests), SUM(credits), SUM(items)
+    FROM proxy_credit_usage
+    WHERE usage_date BETWEEN %s AND %s
+    GROUP BY {group_by}
+    ORDER BY SUM(credits) DESC
+"""
+
+REPORT_GROUPS = {
+    'provider': 'provider',
+    'spider': 'spider_name',
+    'task': 'task_id, spider_name',
+}
+
+
+def install_table():
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(TABLE_SQL)
+    print('Installed proxy_credit_usage table')
+
+
+class CreditBudget:
+    """
+    Cluster-wide daily proxy spend, kept as Redis counters per day (total and
+    per provider) so every crawl and the publisher see the same figure.
+    """
+
+    def __init__(self, redis_url=None, limit=None, soft_ratio=None):
+        self.client = redis.Redis.from_url(redis_url or env['redis'], decode_responses=True)
+        self.limit = daily_credit_budget if limit is None else limit
+        self.soft_ratio = credit_budget_soft_ratio if soft_ratio is None else soft_ratio
+
+    @staticmethod
+    def key(day, provider=None):
+        return f'credits:{day.isoformat()}:{provider or "total"}'
+
+    def add(self, credits_by_provider, day=None):
+        day = day or date.today()
+        pipe = self.client.pipeline()
+        for provider, credits in credits_by_provider.items():
+            for key in (self.key(day), self.key(day, provider)):
+                pipe.incrbyfloat(key, credits)
+                pipe.expire(key, 3 * 24 * 3600)
+        pipe.execute()
+
+    def spent(self, day=None, provider=None):
+        return float(self.client.get(self.key(day or date.today(), provider)) or 0)
+
+    def state(self, day=None):
+        """'ok', 'near' (past the soft ratio of the daily limit) or 'exhausted'. Always 'ok' without a limit."""
+        if not self.limit:
+            return 'ok'
+        try:
+            spent = self.spent(day)
+        except redis.RedisError as e:
+            # Never stop publishing because the counter is unreachable
+            logging.error(f"Failed to read credit spend, not enforcing the budget: {e}")
+            return 'ok'
+        if spent >= self.limit:
+            return 'exhausted'
+        if spent >= self.limit * self.soft_ratio:
+            return 'near'
+        return 'ok'
+
+    def adjust_priority(self, priority, state=None):
+        """
+        Priority to publish a task at under the current budget, or None to
+        leave it PENDING: near the limit LOW tasks wait and NORMAL ones drop
+        to LOW; past it only HIGH tasks run.
+        """
+        state = state or self.state()
+        priority = str(priority).upper()
+        if state == 'exhausted':
+            return priority if priority == 'HIGH' else None
+        if state == 'near':
+            if priority == 'LOW':
+                return None
+            return 'LOW' if priority == 'NORMAL' else priority
+        return priority
+
+    def allowed_priorities(self, state=None):
+        return [p for p in ('HIGH', 'NORMAL', 'LOW') if self.adjust_priority(p, state) is not None]
+
+
+class CreditLedger:
+    """
+    Proxy credits used by one crawl, per provider. Spend is pushed to the
+    daily CreditBudget counters in batches and the totals are written to
+    proxy_credit_usage, next to the task's task_logger row, when the crawl closes.
+    """
+
+    def __init__(self, task_id, celery_task_id, spider_name, costs, budget=None, flush_every=50):
+        self.task_id = task_id or ''
+        self.celery_task_id = celery_task_id or None
+        self.spider_name = spider_name
+        self.costs = costs
+        self.budget = budget or CreditBudget()
+        self.flush_every = flush_every
+        self.usage = defaultdict(lambda: {'requests': 0, 'billed_requests': 0, 'credits': 0.0, 'items': 0})
+        self.unflushed = defaultdict(float)
+
+    def record_request(self, provider, billed):
+        usage = self.usage[provider]
+        usage['requests'] += 1
+        if billed:
+            credits = self.costs.get(provider, 1)
+            usage['billed_requests'] += 1
+            usage['credits'] += credits
+            self.unflushed[provider] += credits
+            if sum(self.unflushed.values()) >= self.flush_every:
+                self.flush_budget()
+
+    def record_item(self, provider):
+        self.usage[provider]['items'] += 1
+
+    def flush_budget(self):
+        if not self.unflushed:
+            return
+        try:
+            self.budget.add(self.unflushed)
+            self.unflushed.clear()
+        except redis.RedisError as e:
+            # Keep the spend buffered, the next flush retries it
+            logging.error(f"Failed to update daily credit spend: {e}")
+
+    def credits_per_item(self, provider=None):
+        rows = [self.usage[provider]] if provider else self.usage.values()
+        credits = sum(row['credits'] for row in rows)
+        items = sum(row['items'] for row in rows)
+        return credits / items if items else None
+
+    def save(self, day=None):
+        self.flush_budget()
+        if not self.usage:
+            return
+        day = day or date.today()
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                for provider, usage in self.usage.items():
+                    cursor.execute(UPSERT_SQL, (
+                        self.task_id, self.celery_task_id, self.spider_name, provider or '', day,
+                        usage['requests'], usage['billed_requests'], usage['credits'], usage['items'],
+                    ))
+
+
+def credit_report(start, end, group='provider'):
+    """Rows of (group columns..., requests, billed requests, credits, items, credits per item)."""
+    group_by = REPORT_GROUPS[group]
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(REPORT_SQL.format(group_by=group_by), (start, end))
+            rows = cursor.fetchall()
+    return [(*row, float(row[-2]) / row[-1] if row[-1] else None) for row in rows]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Proxy credit usage per provider, spider or task.')
+    parser.add_argument('--install-table', action='store_true', help='Create the proxy_credit_usage table and exit.')
+    parser.add_argument('--group', choices=sorted(REPORT_GROUPS), default='provider')
+    parser.add_argument('--days', type=int, default=1, help='Report the last N days, today included.')
+    args = parser.parse_args()
+    if args.install_table:
+        install_table()
+    else:
+        end = date.today()
+        start = end - timedelta(days=args.days - 1)
+        budget = CreditBudget()
+        print(f'Credits {start} .. {end}, today {budget.spent():.0f} of {budget.limit or "unlimited"} ({budget.state()})')
+        for row in credit_report(start, end, args.group):
+            *keys, requests, billed, credits, items, per_item = row
+            per_item = f'{per_item:.2f}' if per_item is not None else '-'
+            print(f'{" / ".join(str(k) for k in keys)}: {credits} credits, {billed}/{requests} billed requests, {items} items, {per_item} credits/item')
@@ -0,0 +1,69 @@
+import os
+import logging
+import threading
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import pool
+from config import environment, app_env, db_pool_min, db_pool_max
+
+env = environment[app_env]
+
+# Process-wide pool, created lazily and recreated in a forked child: a
+# connection inherited across fork shares its socket with the parent
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # Drop the parent's pool without closing its sockets, they still belong to the parent
+            _pool = pool.ThreadedConnectionPool(db_pool_min, db_pool_max, env['db'])
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def reset_pool():
+    """Forget the inherited pool; called in each Celery worker process after fork."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        _pool = None
+        _pool_pid = None
+
+
+def close_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+        _pool_pid = None
+
+
+@contextmanager
+def db_connection():
+    """
+    Borrow a pooled connection. Commits on success, rolls back on error, and
+    discards the connection instead of returning it when it is broken, so the
+    next caller gets a fresh one (reconnect).
+    """
+    connection_pool = get_pool()
+    conn = connection_pool.getconn()
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        broken = broken or bool(conn.closed)
+        if broken:
+            logging.warning("Discarding broken database connection")
+        connection_pool.putconn(conn, close=broken)
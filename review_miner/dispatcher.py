@@ -0,0 +1,187 @@
+import json
+import select
+import argparse
+import time
+import psycopg2
+from datetime import datetime
+from celeryconfig import env, beat_tasks_info
+from tasks import Publisher
+from db import db_connection
+
+CHANNEL = 'task_logger_pending'
+
+# Notifies the dispatcher whenever a task_logger row is (re)set to PENDING
+TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION notify_task_logger_pending() RETURNS trigger AS $$
+BEGIN
+    IF NEW.status = 'PENDING' THEN
+        PERFORM pg_notify('{CHANNEL}', json_build_object(
+            'id', NEW.id,
+            'task_name', NEW.task_name,
+            'start_date', NEW.start_date,
+            'cron_time', NEW.functionality->>'cron_time'
+        )::text);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS task_logger_pending_notify ON task_logger;
+CREATE TRIGGER task_logger_pending_notify
+    AFTER INSERT OR UPDATE OF status, start_date, functionality ON task_logger
+    FOR EACH ROW EXECUTE FUNCTION notify_task_logger_pending();
+"""
+
+
+def install_trigger():
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(TRIGGER_SQL)
+    print(f'Installed task_logger trigger on channel {CHANNEL}')
+
+
+def minute_of_day(cron_time):
+    hours, minutes = cron_time.split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+class TimerWheel:
+    """
+    One slot per minute of the day, matching the HH:MM resolution of
+    cron_time. Each slot holds the task names to publish when the wheel
+    passes it; advance() returns everything between the last tick and now.
+    """
+
+    def __init__(self):
+        self.slots = [set() for _ in range(24 * 60)]
+        self.last_minute = None
+
+    def schedule(self, minute, task_name):
+        self.slots[minute].add(task_name)
+
+    def advance(self, now):
+        current_minute = now.hour * 60 + now.minute
+        # A fresh wheel starts from midnight so rows already overdue today fire on the first tick
+        start = 0 if self.last_minute is None else self.last_minute + 1
+        due = set()
+        for minute in range(start, current_minute + 1):
+            due |= self.slots[minute]
+            self.slots[minute].clear()
+        self.last_minute = current_minute
+        return due
+
+    def clear(self):
+        for slot in self.slots:
+            slot.clear()
+        self.last_minute = None
+
+    @staticmethod
+    def seconds_to_next_minute(now):
+        return 60 - now.second - now.microsecond / 1_000_000
+
+
+class Dispatcher:
+    """
+    Publishes task_logger rows as soon as they become due. Rows that are due
+    when inserted/updated are published on their NOTIFY; rows due later today
+    wait in the timer wheel. Publishing goes through Publisher.publish_task,
+    which claims rows with SKIP LOCKED, so the beat safety-net poll can run
+    alongside.
+    """
+
+    def __init__(self):
+        self.publisher = Publisher()
+        self.tasks_info = {task_name: (task_type, priority) for task_name, task_type, queue_name, priority in beat_tasks_info}
+        self.wheel = TimerWheel()
+        self.today = None
+        self.conn = None
+
+    def connect(self):
+        self.conn = psycopg2.connect(env['db'])
+        self.conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with self.conn.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL};')
+        print(f'Listening on {CHANNEL}')
+
+    def publish(self, task_name):
+        task_type, priority = self.tasks_info[task_name]
+        self.publisher.publish_task(task_name, task_type, priority)
+
+    def load_schedule(self, now):
+        """Fill the wheel with today's PENDING rows. Run at startup, after a reconnect and at midnight."""
+        self.wheel.clear()
+        self.today = now.date()
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT DISTINCT task_name, functionality->>'cron_time' FROM task_logger WHERE status = 'PENDING' AND start_date = %s",
+                    (self.today,)
+                )
+                rows = cursor.fetchall()
+        for task_name, cron_time in rows:
+            if task_name in self.tasks_info and cron_time:
+                self.wheel.schedule(minute_of_day(cron_time), task_name)
+        print(f'Loaded {len(rows)} pending schedule entries for {self.today}')
+
+    def handle_notify(self, payload, now, due):
+        try:
+            row = json.loads(payload)
+        except ValueError:
+            print(f'Ignoring malformed notification: {payload}')
+            return
+        task_name, cron_time = row.get('task_name'), row.get('cron_time')
+        if task_name not in self.tasks_info or not cron_time or row.get('start_date') != now.date().isoformat():
+            # Rows for other days are picked up by the midnight reload
+            return
+        if cron_time <= now.strftime('%H:%M'):
+            due.add(task_name)
+        else:
+            self.wheel.schedule(minute_of_day(cron_time), task_name)
+
+    def run_once(self):
+        now = datetime.now()
+        if now.date() != self.today:
+            self.load_schedule(now)
+
+        # Everything the wheel passed since the last tick
+        due = self.wheel.advance(now)
+
+        timeout = TimerWheel.seconds_to_next_minute(now)
+        if select.select([self.conn], [], [], timeout) != ([], [], []):
+            self.conn.poll()
+            now = datetime.now()
+            while self.conn.notifies:
+                self.handle_notify(self.conn.notifies.pop(0).payload, now, due)
+        due |= self.wheel.advance(datetime.now())
+
+        # One claim per task name covers every due row of that task
+        for task_name in due:
+            self.publish(task_name)
+
+    def run(self):
+        backoff = 1
+        while True:
+            try:
+                if self.conn is None or self.conn.closed:
+                    self.connect()
+                    # Notifications sent while disconnected are lost, rescan
+                    self.today = None
+                self.run_once()
+                backoff = 1
+            except psycopg2.Error as e:
+                print(f'Dispatcher database error: {e}, reconnecting in {backoff}s')
+                if self.conn is not None:
+                    self.conn.close()
+                self.conn = None
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Publish task_logger rows as soon as they are due (LISTEN/NOTIFY).')
+    parser.add_argument('--install-trigger', action='store_true', help='Create the task_logger NOTIFY trigger and exit.')
+    args = parser.parse_args()
+    if args.install_trigger:
+        install_trigger()
+    else:
+        Dispatcher().run()
@@ -0,0 +1,263 @@
+"""
+Live metrics in the Prometheus text format (0.0.4), without a client library.
+Counters, gauges and histograms are kept per process and exported as
+configured by METRICS_MODE:
+
+    textfile  rewritten every METRICS_INTERVAL seconds in METRICS_TEXTFILE_DIR,
+              one file per process, for node-exporter's textfile collector
+    http      served on METRICS_PORT at /metrics, for single-process runs (a
+              standalone crawl, a crawler host); prefork workers should
+              use textfile, only the first process can bind the port
+    off       nothing is exported (the default)
+
+In textfile mode every sample carries a pid label, so the files of concurrent
+crawl processes and Celery workers never define the same series; sum over pid
+in queries.
+"""
+import os
+import re
+import time
+import atexit
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import metrics_mode, metrics_textfile_dir, metrics_port, metrics_interval
+
+_lock = threading.Lock()
+_registry = {}
+_exporter_pid = None
+
+TEXTFILE_PREFIX = 'review_miner_'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self):
+        """(suffix, label values, extra labels, value) for each sample."""
+        for key, value in self.values.items():
+            yield '', key, (), value
+
+    def render(self, extra=()):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, key, labels, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_labels(self.labelnames, key, tuple(labels) + tuple(extra))} {_number(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with _lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with _lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield '_bucket', key, (('le', _number(float(bound))),), cumulative
+            yield '_bucket', key, (('le', '+Inf'),), count
+            yield '_sum', key, (), total
+            yield '_count', key, (), count
+
+
+def _register(cls, name, *args, **kwargs):
+    with _lock:
+        if name not in _registry:
+            _registry[name] = cls(name, *args, **kwargs)
+        return _registry[name]
+
+
+def counter(name, documentation, labelnames=()):
+    return _register(Counter, name, documentation, labelnames)
+
+
+def gauge(name, documentation, labelnames=()):
+    return _register(Gauge, name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), **kwargs):
+    return _register(Histogram, name, documentation, labelnames, **kwargs)
+
+
+def render(extra=()):
+    """Every metric of the process in the text exposition format."""
+    with _lock:
+        return '\n'.join(metric.render(extra) for metric in _registry.values()) + '\n'
+
+
+# Crawl metrics, fed by ScrapySignals and ErrorManager
+REQUESTS = counter('scraper_requests_total', 'Requests that reached the downloader.', ['spider'])
+REQUESTS_IN_FLIGHT = gauge('scraper_requests_in_flight', 'Requests in the downloader.', ['spider'])
+RESPONSES = counter('scraper_responses_total', 'Responses received, by proxy provider and status.', ['spider', 'provider', 'status'])
+DOWNLOAD_LATENCY = histogram('scraper_download_latency_seconds', 'Download latency, by proxy provider.', ['provider'],
+                             buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120))
+ITEMS_SCRAPED = counter('scraper_items_scraped_total', 'Items scraped.', ['spider'])
+ITEMS_DROPPED = counter('scraper_items_dropped_total', 'Items dropped by a pipeline.', ['spider'])
+ERRORS = counter('scraper_errors_total', 'Errors logged by ErrorManager, by ErrorReason.', ['spider', 'reason'])
+
+# Celery metrics, fed by run_spider
+TASK_DURATION = histogram('celery_run_spider_duration_seconds', 'Duration of run_spider tasks, by final status.', ['spider', 'status'],
+                          buckets=(10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200))
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def textfile_path(pid=None):
+    return os.path.join(metrics_textfile_dir, f'{TEXTFILE_PREFIX}{pid or os.getpid()}.prom')
+
+
+def remove_stale_textfiles():
+    """
+    Delete the files of processes that are gone, once they had a few intervals
+    to be collected with their final values.
+    """
+    for file_name in os.listdir(metrics_textfile_dir):
+        match = re.fullmatch(TEXTFILE_PREFIX + r'(\d+)\.prom', file_name)
+        if not match:
+            continue
+        path = os.path.join(metrics_textfile_dir, file_name)
+        try:
+            os.kill(int(match.group(1)), 0)
+        except ProcessLookupError:
+            if time.time() - os.path.getmtime(path) > metrics_interval * 3:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def write_textfile():
+    # Written beside the target and renamed, so the collector never reads a partial file
+    path = textfile_path()
+    with open(path + '.tmp', 'w') as f:
+        f.write(render(extra=(('pid', os.getpid()),)))
+    os.replace(path + '.tmp', path)
+
+
+def _textfile_loop(pid):
+    while _exporter_pid == pid:
+        try:
+            write_textfile()
+            remove_stale_textfiles()
+        except OSError as e:
+            logging.error(f"Failed to write metrics textfile: {e}")
+        time.sleep(metrics_interval)
+
+
+def flush():
+    """Write the textfile now, e.g. when a crawl closes, rather than at the next interval."""
+    if metrics_mode == 'textfile' and _exporter_pid == os.getpid():
+        try:
+            write_textfile()
+        except OSError as e:
+            logging.error(f"Failed to write metrics textfile: {e}")
+
+
+def start_exporter():
+    """
+    Start exporting this process's metrics, as configured by METRICS_MODE.
+    Safe to call repeatedly; a forked child starts its own exporter.
+    """
+    global _exporter_pid
+    if metrics_mode == 'off' or _exporter_pid == os.getpid():
+        return
+    if _exporter_pid is not None:
+        # Forked from an exporting process (a crawl forked by a worker): its values are the parent's to report
+        with _lock:
+            for metric in _registry.values():
+                metric.values.clear()
+    _exporter_pid = os.getpid()
+    if metrics_mode == 'http':
+        try:
+            server = ThreadingHTTPServer(('0.0.0.0', metrics_port), MetricsHandler)
+        except OSError as e:
+            logging.error(f"Metrics endpoint not started on port {metrics_port}: {e}")
+            return
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        logging.info(f"Serving metrics on :{metrics_port}/metrics")
+    elif metrics_mode == 'textfile':
+        os.makedirs(metrics_textfile_dir, exist_ok=True)
+        threading.Thread(target=_textfile_loop, args=(_exporter_pid,), name='metrics-textfile', daemon=True).start()
+        atexit.register(flush)
@@ -0,0 +1,84 @@
+import uuid
+import asyncio
+import logging
+import redis.asyncio as aioredis
+
+# Atomically: expire stale leases, check the concurrency cap, refill and take a
+# token. Returns 0 when a slot was acquired, otherwise the milliseconds to wait
+# before trying again. Time comes from the Redis server so every host shares one clock.
+ACQUIRE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local concurrency = tonumber(ARGV[3])
+local lease_ttl = tonumber(ARGV[5])
+local poll_ms = tonumber(ARGV[6])
+
+if concurrency > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+    if redis.call('ZCARD', KEYS[2]) >= concurrency then
+        return poll_ms
+    end
+end
+
+if rate > 0 then
+    local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or burst)
+    local ts = tonumber(redis.call('HGET', KEYS[1], 'ts') or now)
+    tokens = math.min(burst, tokens + (now - ts) * rate / 1000)
+    if tokens < 1 then
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+        redis.call('PEXPIRE', KEYS[1], 60000)
+        return math.max(1, math.ceil((1 - tokens) * 1000 / rate))
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], 60000)
+end
+
+if concurrency > 0 then
+    redis.call('ZADD', KEYS[2], now + lease_ttl, ARGV[4])
+    redis.call('PEXPIRE', KEYS[2], lease_ttl)
+end
+return 0
+"""
+
+
+class RedisRateLimiter:
+    """
+    Token bucket (requests/sec) plus semaphore (in-flight requests) per key,
+    shared by every crawl on every host through Redis. Leases carry a TTL so a
+    crawl that dies without releasing cannot leak slots.
+    """
+
+    def __init__(self, redis_url, prefix='ratelimit', lease_ttl=240, poll_interval=0.05):
+        self.client = aioredis.Redis.from_url(redis_url)
+        self.prefix = prefix
+        self.lease_ttl_ms = int(lease_ttl * 1000)
+        self.poll_ms = int(poll_interval * 1000)
+        self.acquire_script = self.client.register_script(ACQUIRE_SCRIPT)
+
+    def keys(self, key):
+        return [f'{self.prefix}:{key}:bucket', f'{self.prefix}:{key}:inflight']
+
+    async def acquire(self, key, concurrency=0, rate=0, burst=None):
+        """Wait for a slot under the limits of `key` and return its lease id."""
+        lease_id = uuid.uuid4().hex
+        burst = burst or max(rate, 1)
+        while True:
+            wait_ms = await self.acquire_script(
+                keys=self.keys(key),
+                args=[rate, burst, concurrency, lease_id, self.lease_ttl_ms, self.poll_ms],
+            )
+            if int(wait_ms) == 0:
+                return lease_id
+            await asyncio.sleep(int(wait_ms) / 1000)
+
+    async def release(self, key, lease_id):
+        try:
+            await self.client.zrem(self.keys(key)[1], lease_id)
+        except Exception as e:
+            # The lease TTL frees the slot eventually
+            logging.error(f"Failed to release rate limit lease for {key}: {e}")
+
+    async def close(self):
+        await self.client.aclose()
@@ -2,13 +2,23 @@
 import csv , logging,requests,os,hashlib , requests,shutil
 import scrapy
 from scrapy import signals 
+from scrapy.exceptions import IgnoreRequest
+from twisted.internet import task
 from twisted.internet.error import DNSLookupError, TimeoutError, TCPTimedOutError
+from checkpoint import CheckpointStore
+from proxy import ProxyManager
+import metrics
+from config import error_flush_every, error_flush_seconds, error_log_mode
+from config import signal_log_level, signal_log_sample, signal_log_flush_seconds, signal_sample_size
 
 # Importing For Error Management
-import pandas as pd 
 import os
+import time
+import zlib
+import random
 from datetime import datetime
 from enum import Enum
+from collections import Counter
 
 class ErrorType(Enum):
     NETWORK_ERROR = "Network Error"
@@ -36,19 +46,49 @@ class ErrorReason(Enum):
     # Scraper Errors
     INVALID_API_KEY = 401
     QUOTA_EXCEEDED = 402
+    NO_PROXY_AVAILABLE = 403
 
     # General Errors
     UNKNOWN_ERROR = 501
 
 
+# Columns of the error CSV, in order
+ERROR_FIELDS = ['error_code', 'error_type', 'error_reason', 'error_id', 'task_id', 'celery_id', 'request_url', 'proxy_url',
+                'scraper_name', 'status_code', 'response_url', 'date', 'time', 'exception']
+
+# Columns of the rollup summary: one row per error_id and error_code, with the first occurrence's details
+ERROR_SUMMARY_FIELDS = ERROR_FIELDS[:11] + ['count', 'first_seen', 'last_seen', 'exception']
+
+
 class ErrorManager:
-    def __init__(self, task_id, celery_id, scraper_name):
-        self.file_name = f"Error__{task_id}__{celery_id}__{datetime.utcnow().strftime('%Y-%m-%d_%H:%M:%S')}.csv"
+    """
+    Per-crawl error log. In 'rows' mode errors are buffered in memory and
+    appended to the CSV in batches, once flush_every are waiting or
+    flush_seconds after the last write, and on spider_closed (see close).
+    The time limit is checked as errors arrive and on ScrapySignals' timer,
+    so the last errors before a quiet spell are not held back.
+    In 'rollup' mode occurrences are counted per error_id and error_code and
+    only the summary is written, on close.
+    """
+
+    def __init__(self, task_id, celery_id, scraper_name, flush_every=None, flush_seconds=None, mode=None):
+        timestamp = datetime.utcnow().strftime('%Y-%m-%d_%H:%M:%S')
+        self.file_name = f"Error__{task_id}__{celery_id}__{timestamp}.csv"
         self.file_path = os.path.join(os.getcwd(), 'data', self.file_name)
+        self.summary_path = os.path.join(os.getcwd(), 'data', f"ErrorSummary__{task_id}__{celery_id}__{timestamp}.csv")
         self.task_id = task_id
         self.celery_id = celery_id
         self.scraper_name = scraper_name
         self.max_error_code = None
+        self.flush_every = flush_every or error_flush_every
+        self.flush_seconds = flush_seconds if flush_seconds is not None else error_flush_seconds
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self.mode = mode or error_log_mode
+        # (error_id, error_code) -> [count, first_seen, last_seen, first row]
+        self.rollup = {}
+        # Occurrences per error code, reported to the task (see ScrapySignals.spider_closed)
+        self.code_counts = Counter()
         self.ensure_directory_exists()
 
     def ensure_directory_exists(self):
@@ -57,8 +97,6 @@ class ErrorManager:
 
     def log_error(self, error_type: ErrorType, error_reason: ErrorReason, request_url, proxy_url=None, response=None, exception=None, meta=None):
         """Centralized error logging method."""
-        file_exists = os.path.isfile(self.file_path)
-
         # Swap error_code and error_reason_description
         error_code = error_reason.value  # Use the value of error_reason as the error code
         error_reason_description = error_reason.name  # Use the name of error_reason as the description
@@ -66,33 +104,85 @@ class ErrorManager:
         # Update max_error_code
         if not self.max_error_code or error_code < self.max_error_code:
             self.max_error_code = error_code
+        self.code_counts[error_code] += 1
+        metrics.ERRORS.inc(spider=self.scraper_name, reason=error_reason_description)
+
+        # Row in ERROR_FIELDS order
+        now = datetime.utcnow()
+        error_id = hashlib.md5((request_url + error_reason_description).encode()).hexdigest()
+        row = [
+            error_code,  # Numeric code
+            error_type.value,
+            error_reason_description,  # Reason description (e.g., "MISSING_ATTRIBUTE")
+            error_id,
+            self.task_id,
+            self.celery_id,
+            request_url,
+            proxy_url,
+            self.scraper_name,
+            getattr(response, 'status', None) if response else None,
+            getattr(response, 'url', None) if response else None,
+            now.strftime("%Y-%m-%d"),
+            now.strftime("%H:%M:%S"),
+            str(exception) if exception else None
+        ]
+        logging.info("Error logged: %s - %s", error_type.value, error_reason_description)
+
+        if self.mode == 'rollup':
+            seen_at = f'{row[11]} {row[12]}'
+            entry = self.rollup.get((error_id, error_code))
+            if entry:
+                entry[0] += 1
+                entry[2] = seen_at
+            else:
+                self.rollup[(error_id, error_code)] = [1, seen_at, seen_at, row]
+            return
+
+        self.buffer.append(row)
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        """Flush the buffer if flush_seconds have passed since the last write."""
+        if self.buffer and time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Append the buffered errors to the CSV file."""
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        rows, self.buffer = self.buffer, []
+        try:
+            file_exists = os.path.isfile(self.file_path)
+            with open(self.file_path, 'a', newline='') as csvfile:
+                writer = csv.writer(csvfile)
+                if not file_exists:
+                    writer.writerow(ERROR_FIELDS)
+                writer.writerows(rows)
+        except Exception as e:
+            logging.error(f"Failed to log {len(rows)} errors to CSV: {e}")
 
-        # Prepare error data for logging
-        error_data = {
-            'error_code': error_code,  # Numeric code
-            'error_type': error_type.value, 
-            'error_reason': error_reason_description,  # Reason description (e.g., "MISSING_ATTRIBUTE")
-            'error_id': hashlib.md5((request_url + error_reason_description).encode()).hexdigest(),
-            'task_id': self.task_id,
-            'celery_id': self.celery_id,
-            'request_url': request_url,
-            'proxy_url': proxy_url,
-            'scraper_name': self.scraper_name,
-            'status_code': getattr(response, 'status', None) if response else None,
-            'response_url': getattr(response, 'url', None) if response else None,
-            'date': datetime.utcnow().strftime("%Y-%m-%d"),
-            'time': datetime.utcnow().strftime("%H:%M:%S"),
-            'exception': str(exception) if exception else None
-        }
-
-        # Write error data to a CSV file
-        df = pd.DataFrame([error_data])
+    def write_summary(self):
+        """Write the rollup, one row per error_id and error_code, with the sample exception of its first occurrence."""
+        if not self.rollup:
+            return
         try:
-            df.to_csv(self.file_path, header=not file_exists, mode="a", index=False)
-            logging.info(f"Error logged: {error_type.value} - {error_reason_description}")
+            with open(self.summary_path, 'w', newline='') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(ERROR_SUMMARY_FIELDS)
+                for count, first_seen, last_seen, row in self.rollup.values():
+                    writer.writerow(row[:11] + [count, first_seen, last_seen, row[13]])
+            logging.info(f"Wrote {len(self.rollup)} error groups ({sum(self.code_counts.values())} errors) to {self.summary_path}")
         except Exception as e:
-            logging.error(f"Failed to log error to CSV: {e}")
+            logging.error(f"Failed to write error summary to CSV: {e}")
 
+    def close(self):
+        """Write whatever is still buffered, or the rollup summary; called on spider_closed."""
+        self.flush()
+        self.write_summary()
 
     def handle_error(self, error_mapping, request_url,proxy_url=None, response=None, exception=None, meta=None):
         """Generic error handler that logs errors based on a mapping."""
@@ -110,6 +200,9 @@ class ErrorManager:
     def handle_network_error(self, failure):
         """Handle network-related errors."""
         error_mapping = None
+        if failure.check(IgnoreRequest):
+            # Dropped on purpose by a middleware, which reports its own reason
+            return
         if failure.check(DNSLookupError):
             error_mapping = (ErrorType.NETWORK_ERROR, ErrorReason.DNS_LOOKUP_FAILURE)
         elif failure.check(TimeoutError, TCPTimedOutError):
@@ -120,7 +213,7 @@ class ErrorManager:
         self.handle_error(
             error_mapping,
             request_url=failure.request.meta.get('original_url', failure.request.url),  # Use original URL
-            proxy_url=failure.request.url,  # Use proxied URL
+            proxy_url=failure.request.meta.get('proxy_url'),  # Proxy endpoint or API URL set by the proxy middleware
             exception=failure.value
         )
 
@@ -160,156 +253,296 @@ class ErrorManager:
         error_mapping = (ErrorType.GENERAL_ERROR, ErrorReason.UNKNOWN_ERROR)
         self.handle_error(error_mapping, request_url=request_url, proxy_url=proxy_url, exception=exception)
 
-class ScrapySignals:
-    successful_requests = 0
-    failed_requests = 0
-    total_urls = 0
-    url_status_map = {}
-    scraped_items_count_map = {}
-    total_items_on_page = 0
-    scraped_items_count = 0
-    dropped_items_count = 0
-    successful_no_items = []
+# Verbosity of each ScrapySignals event, compared with SIGNAL_LOG_LEVEL
+LOG_LIFECYCLE = 1   # spider/engine open and close, idle, circuit breaker, URL statuses
+LOG_REQUEST = 2     # scheduled, dropped, response received, items, spider errors
+LOG_DOWNLOADER = 3  # downloader enter/leave, headers received, response downloaded
+LOG_CHUNK = 4       # every bytes_received chunk
+
+
+class EventLog:
+    """
+    ScrapySignals' CSV event log. One handle is kept open for the whole crawl
+    and written through a large buffer, flushed every flush_seconds and on
+    close, so an event costs a csv row rather than an open/close of the file.
+    """
+
+    FIELDS = ['Log Type', 'Message', 'Original URL', 'Proxy URL', 'Status Code', 'Date', 'Time', 'Total Time Taken (seconds)', 'Bytes Received']
+
+    def __init__(self, path, flush_seconds=None, buffer_size=256 * 1024):
+        self.path = path
+        self.flush_seconds = flush_seconds if flush_seconds is not None else signal_log_flush_seconds
+        self.file = open(path, 'w', newline='', buffering=buffer_size)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.FIELDS)
+        self.last_flush = time.monotonic()
+
+    def write(self, log_type, message, original_url=None, proxy_url=None, status_code=None, total_time_taken=None, bytes_received=None):
+        if self.file is None:
+            return
+        try:
+            now = datetime.utcnow()
+            self.writer.writerow([log_type, message, original_url, proxy_url, status_code, now.strftime('%Y-%m-%d'),
+                                  now.strftime('%H:%M:%S'), total_time_taken, bytes_received])
+            self.flush_if_due()
+        except Exception as e:
+            logging.error("Failed to write log to CSV: %s", e)
 
-    @staticmethod
-    def connect_signals(crawler, task_id, celery_id):
+    def flush_if_due(self):
+        if time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class Reservoir:
+    """Uniform sample of at most `size` of the values added (reservoir sampling), with the total count."""
+
+    def __init__(self, size):
+        self.size = size
+        self.count = 0
+        self.values = []
+
+    def add(self, value):
+        self.count += 1
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            index = random.randrange(self.count)
+            if index < self.size:
+                self.values[index] = value
+
+
+class ScrapySignals:
+    """
+    Crawl bookkeeping and event log, as a Scrapy extension (see EXTENSIONS).
+    Each crawler gets its own instance, event CSV and checkpoint, and the state
+    kept for the crawl is bounded (counters and fixed-size URL samples), so
+    several crawls can run in one process and reactor.
+    """
+
+    def __init__(self, crawler, sample_size=None):
+        self.crawler = crawler
+        self.successful_requests = 0
+        self.failed_requests = 0
+        self.total_urls = 0
+        self.scraped_items_count = 0
+        self.dropped_items_count = 0
+        # Requests by last known state (Scheduled / Failed), with a sample of the failed URLs
+        self.url_status_counts = Counter()
+        sample_size = sample_size or signal_sample_size
+        self.failed_urls = Reservoir(sample_size)
+        self.successful_no_items = Reservoir(sample_size)
+        self.start_time = None
+        self.checkpoint = None
+        self.event_log = None
+        self.csv_file = None
+        # Flushes the error and event logs on a timer while the spider runs (see spider_opened)
+        self.flush_loop = None
+        self.connect_signals()
+        metrics.start_exporter()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def connect_signals(self):
+        # Handlers that keep counters, metrics, checkpoints or byte totals, connected at any log level
         signal_map = {
-            signals.spider_opened: ScrapySignals.spider_opened,
-            signals.spider_closed: ScrapySignals.spider_closed,
-            signals.engine_started: ScrapySignals.engine_started,
-            signals.engine_stopped: ScrapySignals.engine_stopped,
-            signals.request_scheduled: ScrapySignals.request_scheduled,
-            signals.request_dropped: ScrapySignals.request_dropped,
-            signals.request_reached_downloader: ScrapySignals.request_reached_downloader,
-            signals.request_left_downloader: ScrapySignals.request_left_downloader,
-            signals.response_received: ScrapySignals.response_received,
-            signals.response_downloaded: ScrapySignals.response_downloaded,
-            signals.item_scraped: ScrapySignals.item_scraped,
-            signals.item_dropped: ScrapySignals.item_dropped,
-            signals.spider_idle: ScrapySignals.spider_idle_handler,
-            signals.spider_error: ScrapySignals.spider_error,
-            scrapy.signals.bytes_received: ScrapySignals.on_bytes_received,
-            scrapy.signals.headers_received: ScrapySignals.on_headers_received,
+            signals.spider_opened: self.spider_opened,
+            signals.spider_closed: self.spider_closed,
+            signals.engine_started: self.engine_started,
+            signals.engine_stopped: self.engine_stopped,
+            signals.request_scheduled: self.request_scheduled,
+            signals.request_dropped: self.request_dropped,
+            signals.request_reached_downloader: self.request_reached_downloader,
+            signals.request_left_downloader: self.request_left_downloader,
+            signals.response_received: self.response_received,
+            signals.item_scraped: self.item_scraped,
+            signals.item_dropped: self.item_dropped,
+            signals.spider_error: self.spider_error,
+            scrapy.signals.bytes_received: self.on_bytes_received,
+        }
+        # Handlers that only log, connected when SIGNAL_LOG_LEVEL includes their level
+        logging_signal_map = {
+            signals.spider_idle: (self.spider_idle_handler, LOG_LIFECYCLE),
+            signals.response_downloaded: (self.response_downloaded, LOG_DOWNLOADER),
+            scrapy.signals.headers_received: (self.on_headers_received, LOG_DOWNLOADER),
         }
         for signal, handler in signal_map.items():
-            crawler.signals.connect(handler, signal=signal)
-        ScrapySignals.initialize_csv(task_id, celery_id)
+            self.crawler.signals.connect(handler, signal=signal)
+        for signal, (handler, level) in logging_signal_map.items():
+            if level <= signal_log_level:
+                self.crawler.signals.connect(handler, signal=signal)
 
-    @staticmethod
-    def initialize_csv(task_id, celery_id):
+    def initialize_csv(self, task_id, celery_id, spider_name):
         new_dir = os.path.join(os.getcwd(), 'data')
         os.makedirs(new_dir, exist_ok=True)
         timestamp = datetime.utcnow().strftime("%Y-%m-%d_%H:%M:%S")
-        ScrapySignals.csv_file = os.path.join(new_dir, f'scrapysignals__{task_id}__{celery_id}__{timestamp}.csv')
-        with open(ScrapySignals.csv_file, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=['Log Type', 'Message', 'Original URL', 'Proxy URL', 'Status Code', 'Date', 'Time', 'Total Time Taken (seconds)'])
-            writer.writeheader()
+        self.csv_file = os.path.join(new_dir, f'scrapysignals__{task_id}__{celery_id}__{timestamp}.csv')
+        if os.path.exists(self.csv_file):
+            # Another crawl of the same task started in the same second
+            self.csv_file = self.csv_file[:-len('.csv')] + f'__{spider_name}_{id(self):x}.csv'
+        self.event_log = EventLog(self.csv_file)
 
     @staticmethod
-    def log_event(log_type, message, original_url=None, proxy_url=None, status_code=None, total_time_taken=None):
-        try:
-            current_time = datetime.utcnow()
-            date_str = current_time.strftime('%Y-%m-%d')
-            time_str = current_time.strftime('%H:%M:%S')
-            with open(ScrapySignals.csv_file, 'a', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow([log_type, message, original_url, proxy_url, status_code, date_str, time_str, total_time_taken])
-        except Exception as e:
-            logging.error("Failed to write log to CSV: %s", e)
+    def sampled(url):
+        """Whether events of this URL are logged; the choice is stable per URL, so a sampled URL keeps all its events."""
+        return signal_log_sample >= 1 or (url is not None and zlib.crc32(url.encode()) % 10000 < signal_log_sample * 10000)
 
-    @staticmethod
-    def log_and_update(message, log_type, request=None, status_code=None, status_map_key=None):
+    def log_event(self, log_type, message, original_url=None, proxy_url=None, status_code=None, total_time_taken=None, level=LOG_LIFECYCLE, bytes_received=None):
+        if level > signal_log_level or self.event_log is None:
+            return
+        self.event_log.write(log_type, message, original_url, proxy_url, status_code, total_time_taken, bytes_received)
+
+    def log_and_update(self, message, log_type, request=None, status_code=None, status_map_key=None, level=LOG_REQUEST, bytes_received=None):
         """
-        Logs a message and updates the URL status map if required.
+        Logs a message and counts the request's new state if required.
         """
-        logging.info(message)
+        if status_map_key:
+            self.url_status_counts[status_code] += 1
+        if level > signal_log_level:
+            return
         original_url = request.meta.get('original_url') if request else None
+        if request and not self.sampled(original_url or request.url):
+            return
+        logging.info(message)
         proxy_url = request.meta.get('proxy_url') if request else None
-        if status_map_key:
-            ScrapySignals.url_status_map[status_map_key] = status_code
-        ScrapySignals.log_event(log_type, message, original_url, proxy_url, status_code)
-
-    @staticmethod
-    def spider_opened(spider):
-        ScrapySignals.start_time = datetime.utcnow()
+        self.log_event(log_type, message, original_url, proxy_url, status_code, level=level, bytes_received=bytes_received)
+
+    def spider_opened(self, spider):
+        self.start_time = datetime.utcnow()
+        task_id = getattr(spider, 'task_id', '')
+        # Error counts of the crawl are reported to the task through its checkpoint
+        self.checkpoint = CheckpointStore(task_id) if task_id else None
+        ProxyManager.add_breaker_listener(self.on_breaker_transition)
+        self.initialize_csv(task_id, getattr(spider, 'celery_id', ''), spider.name)
         # Log spider opened event
-        ScrapySignals.log_event(f"{spider.name} opened", "Spider Opened")
-
-    @staticmethod
-    def spider_closed(spider, reason):
-        total_time_taken = (datetime.utcnow() - ScrapySignals.start_time).total_seconds() if ScrapySignals.start_time else "N/A"
+        self.log_event(f"{spider.name} opened", "Spider Opened")
+        # Buffered errors and events are otherwise only written when the next one arrives
+        error_manager = getattr(spider, 'error_manager', None)
+        intervals = [seconds for seconds in (getattr(error_manager, 'flush_seconds', None), self.event_log.flush_seconds) if seconds]
+        if intervals:
+            self.flush_loop = task.LoopingCall(self.flush_logs, spider)
+            self.flush_loop.start(min(intervals), now=False)
+
+    def flush_logs(self, spider):
+        error_manager = getattr(spider, 'error_manager', None)
+        if error_manager is not None:
+            error_manager.flush_if_due()
+        if self.event_log is not None:
+            self.event_log.flush_if_due()
+
+    def spider_closed(self, spider, reason):
+        if self.flush_loop is not None and self.flush_loop.running:
+            self.flush_loop.stop()
+        total_time_taken = (datetime.utcnow() - self.start_time).total_seconds() if self.start_time else "N/A"
         # Log spider closed event
-        ScrapySignals.log_event(f"{spider.name} closed", "Spider Closed", total_time_taken=total_time_taken)
-
-        # Log the status of each URL
-        for url, status in ScrapySignals.url_status_map.items():
-            ScrapySignals.log_event("URL Status", f"URL: {url} Status: {status}", original_url=url, total_time_taken=total_time_taken)
-
-    @staticmethod
-    def engine_started():
-        ScrapySignals.log_event("Engine Started", "Engine Started")
-
-    @staticmethod
-    def engine_stopped():
-        ScrapySignals.log_event("Engine Stopped", "Engine Stopped")
-
-    @staticmethod
-    def request_scheduled(request, spider):
-        ScrapySignals.total_urls += 1
-        ScrapySignals.log_and_update("Request Scheduled", "Request Scheduled", request=request, status_map_key=request.url, status_code="Scheduled")
-
-    @staticmethod
-    def request_dropped(request, spider):
-        ScrapySignals.failed_requests += 1
-        ScrapySignals.log_and_update("Request Dropped", "Request Dropped", request=request, status_map_key=request.url, status_code="Failed")
-
-    @staticmethod
-    def request_reached_downloader(request, spider):
-        ScrapySignals.log_and_update("Request Reached Downloader", "Request Reached Downloader", request=request)
-
-    @staticmethod
-    def request_left_downloader(request, spider):
-        ScrapySignals.log_and_update("Request Left Downloader", "Request Left Downloader", request=request)
-
-    @staticmethod
-    def response_received(response, request, spider):
+        self.log_event(f"{spider.name} closed", "Spider Closed", total_time_taken=total_time_taken)
+
+        # Request states, then the sampled URLs that failed or returned no items
+        states = ', '.join(f"{status}: {count}" for status, count in self.url_status_counts.items())
+        self.log_event("URL Status", f"Requests {states}", total_time_taken=total_time_taken)
+        for url in self.failed_urls.values:
+            self.log_event("URL Status", f"URL: {url} Status: Failed", original_url=url, total_time_taken=total_time_taken)
+        for url in self.successful_no_items.values:
+            self.log_event("URL Status", f"URL: {url} Status: No Items", original_url=url, total_time_taken=total_time_taken)
+        if self.event_log:
+            self.event_log.flush()
+        ProxyManager.remove_breaker_listener(self.on_breaker_transition)
+        metrics.flush()
+
+        error_manager = getattr(spider, 'error_manager', None)
+        if error_manager:
+            error_manager.close()
+            if self.checkpoint:
+                # run_spider reads these back to set the task's final status
+                self.checkpoint.add_error_counts(error_manager.code_counts, getattr(spider, 'celery_id', ''))
+
+    def engine_started(self):
+        self.log_event("Engine Started", "Engine Started")
+
+    def engine_stopped(self):
+        self.log_event("Engine Stopped", "Engine Stopped")
+        # Last signal of the crawl
+        if self.event_log:
+            self.event_log.close()
+
+    def request_scheduled(self, request, spider):
+        self.total_urls += 1
+        self.log_and_update("Request Scheduled", "Request Scheduled", request=request, status_map_key=request.url, status_code="Scheduled")
+
+    def request_dropped(self, request, spider):
+        self.failed_requests += 1
+        self.failed_urls.add(request.url)
+        self.log_and_update("Request Dropped", "Request Dropped", request=request, status_map_key=request.url, status_code="Failed")
+
+    def request_reached_downloader(self, request, spider):
+        metrics.REQUESTS.inc(spider=spider.name)
+        metrics.REQUESTS_IN_FLIGHT.inc(spider=spider.name)
+        self.log_and_update("Request Reached Downloader", "Request Reached Downloader", request=request, level=LOG_DOWNLOADER)
+
+    def request_left_downloader(self, request, spider):
+        metrics.REQUESTS_IN_FLIGHT.dec(spider=spider.name)
+        self.log_and_update("Request Left Downloader", "Request Left Downloader", request=request, level=LOG_DOWNLOADER)
+
+    def response_received(self, response, request, spider):
         status_code = response.status
-        items_scraped = ScrapySignals.scraped_items_count_map.get(request.url, 0)
+        # Items are counted on the request's meta (see item_scraped), so nothing is kept per URL here
+        items_scraped = request.meta.get('items_scraped', 0)
+        # Body bytes of the request as they came off the wire, summed by on_bytes_received
+        bytes_received = request.meta.get('bytes_received')
+        provider = request.meta.get('proxy_provider') or 'direct'
+        metrics.RESPONSES.inc(spider=spider.name, provider=provider, status=status_code)
+        if 'download_latency' in request.meta:
+            metrics.DOWNLOAD_LATENCY.observe(request.meta['download_latency'], provider=provider)
         if status_code == 200 and items_scraped > 0:
-            ScrapySignals.log_and_update("Response received", "Response Received", request=request, status_code=status_code)
+            self.successful_requests += 1
+            self.log_and_update("Response received", "Response Received", request=request, status_code=status_code, bytes_received=bytes_received)
         elif status_code == 200 and items_scraped == 0:
-            ScrapySignals.successful_no_items.append(request.url)
-            ScrapySignals.log_and_update("Response received with no items", "No Items Scraped", request=request, status_code=status_code)
+            self.successful_requests += 1
+            self.successful_no_items.add(request.url)
+            self.log_and_update("Response received with no items", "No Items Scraped", request=request, status_code=status_code, bytes_received=bytes_received)
         else:
-            ScrapySignals.log_and_update("Failed request", "Failed Request", request=request, status_code=status_code)
+            self.log_and_update("Failed request", "Failed Request", request=request, status_code=status_code, bytes_received=bytes_received)
 
-    @staticmethod
-    def response_downloaded(response, request, spider):
-        ScrapySignals.log_and_update("Response Downloaded", "Response Downloaded", request=request)
+    def response_downloaded(self, response, request, spider):
+        self.log_and_update("Response Downloaded", "Response Downloaded", request=request, level=LOG_DOWNLOADER)
 
-    @staticmethod
-    def item_scraped(item, response, spider):
-        request_url = response.request.url
-        ScrapySignals.scraped_items_count_map[request_url] = ScrapySignals.scraped_items_count_map.get(request_url, 0) + 1
-        ScrapySignals.log_and_update("Item scraped", "Item Scraped", request=response.request)
+    def item_scraped(self, item, response, spider):
+        self.scraped_items_count += 1
+        metrics.ITEMS_SCRAPED.inc(spider=spider.name)
+        response.meta['items_scraped'] = response.meta.get('items_scraped', 0) + 1
+        self.log_and_update("Item scraped", "Item Scraped", request=response.request)
 
-    @staticmethod
-    def item_dropped(item, response, exception, spider):
-        ScrapySignals.log_and_update("Item dropped", "Item Dropped", request=response.request)
+    def item_dropped(self, item, response, exception, spider):
+        self.dropped_items_count += 1
+        metrics.ITEMS_DROPPED.inc(spider=spider.name)
+        self.log_and_update("Item dropped", "Item Dropped", request=response.request)
 
-    @staticmethod
-    def spider_idle_handler(spider):
-        ScrapySignals.log_and_update("Spider is idle", "Spider Idle")
+    def spider_idle_handler(self, spider):
+        self.log_and_update("Spider is idle", "Spider Idle", level=LOG_LIFECYCLE)
 
-    @staticmethod
-    def spider_error(failure, response, spider):
-        ScrapySignals.failed_requests += 1
-        ScrapySignals.log_and_update("Spider error", "Spider Error", request=response.request)
+    def spider_error(self, failure, response, spider):
+        self.failed_requests += 1
+        self.log_and_update("Spider error", "Spider Error", request=response.request)
 
-    @staticmethod
-    def on_bytes_received(data, request, spider):
-        ScrapySignals.log_and_update(f"{len(data)} bytes received", "Bytes Received", request=request)
+    def on_bytes_received(self, data, request, spider):
+        # Fires per network chunk: keep a per-request total for response_received rather than a row per chunk
+        request.meta['bytes_received'] = request.meta.get('bytes_received', 0) + len(data)
+        if signal_log_level >= LOG_CHUNK:
+            self.log_and_update(f"{len(data)} bytes received", "Bytes Received", request=request, level=LOG_CHUNK)
 
-    @staticmethod
-    def on_headers_received(headers, request, spider):
-        ScrapySignals.log_and_update("Headers Received", "Headers Received", request=request)
+    def on_breaker_transition(self, provider, previous_state, new_state, reason):
+        self.log_event("Circuit Breaker", f"{provider}: {previous_state} -> {new_state} ({reason})")
+
+    def on_headers_received(self, headers, request, spider):
+        self.log_and_update("Headers Received", "Headers Received", request=request, level=LOG_DOWNLOADER)
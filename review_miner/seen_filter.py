@@ -0,0 +1,181 @@
+import math
+import time
+import hashlib
+import logging
+import redis
+from abc import ABC, abstractmethod
+from config import environment, app_env, seen_filter_capacity, seen_filter_error_rate, seen_filter_ttl_hours
+
+env = environment[app_env]
+
+# 1 when every bit of the key is set in one of the windows (KEYS), else 0
+CONTAINS_SCRIPT = """
+for w = 1, #KEYS do
+    local found = 1
+    for i = 1, #ARGV do
+        if redis.call('GETBIT', KEYS[w], ARGV[i]) == 0 then
+            found = 0
+            break
+        end
+    end
+    if found == 1 then
+        return 1
+    end
+end
+return 0
+"""
+
+
+class BloomFilter(ABC):
+    """
+    Sizing and hashing shared by the Bloom filter backends. Keys are kept for
+    a TTL window: adds go to the current window, lookups check it and the
+    previous one, so a key is remembered for between ttl and 2 * ttl seconds.
+    """
+
+    def __init__(self, name, capacity=None, error_rate=None, ttl=None):
+        self.name = name
+        capacity = capacity or seen_filter_capacity
+        error_rate = error_rate or seen_filter_error_rate
+        self.ttl = ttl or seen_filter_ttl_hours * 3600
+        self.size = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+
+    def offsets(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def window(self, now=None):
+        return int((now or time.time()) // self.ttl)
+
+    @abstractmethod
+    def contains_many(self, keys):
+        pass
+
+    @abstractmethod
+    def add_many(self, keys):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+class RedisBloomFilter(BloomFilter):
+    """Bloom filter in Redis bitmaps, one per TTL window, shared by every worker."""
+
+    def __init__(self, name, redis_url=None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.client = redis.Redis.from_url(redis_url or env['redis'])
+        self.contains_script = self.client.register_script(CONTAINS_SCRIPT)
+
+    def keys(self):
+        window = self.window()
+        return [f'seen:{self.name}:{window}', f'seen:{self.name}:{window - 1}']
+
+    def contains_many(self, keys):
+        window_keys = self.keys()
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            self.contains_script(keys=window_keys, args=self.offsets(key), client=pipe)
+        return [bool(found) for found in pipe.execute()]
+
+    def add_many(self, keys):
+        current = self.keys()[0]
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            for offset in self.offsets(key):
+                pipe.setbit(current, offset, 1)
+        pipe.pexpire(current, int(self.ttl * 2 * 1000))
+        pipe.execute()
+
+    def clear(self):
+        # Older windows have expired, only the two read windows can hold keys
+        self.client.delete(*self.keys())
+
+
+class LocalBloomFilter(BloomFilter):
+    """In-process Bloom filter with the same windows, for tests and when Redis is unreachable."""
+
+    def __init__(self, name, **kwargs):
+        super().__init__(name, **kwargs)
+        self.windows = {}
+
+    def bits(self, window):
+        if window not in self.windows:
+            # Only the current and previous windows are ever read
+            for old in [w for w in self.windows if w < window - 1]:
+                del self.windows[old]
+            self.windows[window] = bytearray((self.size + 7) // 8)
+        return self.windows[window]
+
+    def contains_many(self, keys):
+        window = self.window()
+        windows = [self.windows[w] for w in (window, window - 1) if w in self.windows]
+        return [
+            any(all(bits[offset >> 3] & (1 << (offset & 7)) for offset in self.offsets(key)) for bits in windows)
+            for key in keys
+        ]
+
+    def add_many(self, keys):
+        bits = self.bits(self.window())
+        for key in keys:
+            for offset in self.offsets(key):
+                bits[offset >> 3] |= 1 << (offset & 7)
+
+    def clear(self):
+        self.windows.clear()
+
+
+class SeenFilter:
+    """
+    Cross-worker seen-set of recently scraped keys (Redis Bloom filter). Adds
+    are buffered and written in batches; buffered keys already count as seen.
+    Falls back to an in-process filter for the rest of its life when Redis
+    fails, so a Redis outage costs duplicate fetches rather than a failed
+    crawl. `local=True` never uses Redis.
+    """
+
+    def __init__(self, name, local=False, flush_every=100, **kwargs):
+        self.name = name
+        self.kwargs = kwargs
+        self.flush_every = flush_every
+        self.pending = set()
+        self.backend = LocalBloomFilter(name, **kwargs) if local else RedisBloomFilter(name, **kwargs)
+
+    def fall_back(self, error):
+        logging.error(f"Seen filter {self.name} lost Redis, using a local filter: {error}")
+        self.backend = LocalBloomFilter(self.name, **self.kwargs)
+
+    def contains_many(self, keys):
+        keys = list(keys)
+        try:
+            found = self.backend.contains_many(keys)
+        except redis.RedisError as e:
+            self.fall_back(e)
+            found = self.backend.contains_many(keys)
+        return [hit or key in self.pending for key, hit in zip(keys, found)]
+
+    def contains(self, key):
+        return self.contains_many([key])[0]
+
+    def add(self, key):
+        self.pending.add(key)
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        try:
+            self.backend.add_many(self.pending)
+        except redis.RedisError as e:
+            self.fall_back(e)
+            self.backend.add_many(self.pending)
+        self.pending = set()
+
+    def clear(self):
+        self.pending = set()
+        self.backend.clear()
@@ -0,0 +1,252 @@
+import os
+import sys
+import queue
+import logging
+import resource
+import threading
+import billiard
+
+# Project path must be importable for spiders (they import scrapermanagement, proxy, ...)
+project_path = os.path.dirname(os.path.abspath(__file__))
+if project_path not in sys.path:
+    sys.path.insert(0, project_path)
+
+
+def get_spider_kwargs(task_type, url_source, unique_id, celery_task_id):
+    """Spider arguments, the in-process equivalent of the `-a` options of `scrapy crawl`."""
+    if task_type in ['amz_browsenodes', 'cvs_browsenodes']:
+        return {'task_id': unique_id, 'celery_id': celery_task_id}
+    return {'url_source': url_source, 'task_id': unique_id, 'celery_id': celery_task_id}
+
+
+def get_crawl_settings(filename, settings_module):
+    """Project settings plus the `-o` / `-s` overrides the shell command would pass."""
+    from scrapy.utils.project import get_project_settings
+
+    os.environ['SCRAPY_SETTINGS_MODULE'] = settings_module
+    settings = get_project_settings()
+    settings.set('SETTINGS_MODULE', settings_module, priority='cmdline')
+    settings.set('FEEDS', {filename: {'format': 'csv'}}, priority='cmdline')
+    return settings
+
+
+def preload(settings_module='amazon.settings'):
+    """
+    Import Scrapy, the settings module and every spider class up front, so that
+    crawls forked from this process skip interpreter startup and imports.
+    The Twisted reactor is not installed here; each crawl installs its own.
+    """
+    from scrapy.spiderloader import SpiderLoader
+    from scrapy.utils.project import get_project_settings
+
+    os.environ.setdefault('SCRAPY_SETTINGS_MODULE', settings_module)
+    settings = get_project_settings()
+    spider_loader = SpiderLoader.from_settings(settings)
+    logging.info(f"Preloaded spiders: {', '.join(spider_loader.list())}")
+    return spider_loader
+
+
+def crawl(spider_name, spider_kwargs, filename, settings_module):
+    """Run one crawl with CrawlerProcess and return an exit code like `scrapy crawl` does."""
+    from scrapy.crawler import CrawlerProcess
+
+    process = CrawlerProcess(get_crawl_settings(filename, settings_module))
+    crawl_defer = process.crawl(spider_name, **spider_kwargs)
+    if getattr(crawl_defer, 'result', None) is not None and issubclass(crawl_defer.result.type, Exception):
+        return 1
+    process.start()
+    return 1 if process.bootstrap_failed else 0
+
+
+def _crawl_entry(spider_name, spider_kwargs, filename, settings_module):
+    os.chdir(project_path)
+    sys.exit(crawl(spider_name, spider_kwargs, filename, settings_module))
+
+
+def run_in_process(spider_name, url_source, unique_id, celery_task_id, filename, task_type, settings_module):
+    """
+    Run the spider in a process forked from the worker. The fork inherits the
+    already imported Scrapy/spider modules and gets a fresh reactor, since the
+    Twisted reactor cannot be restarted in the same process.
+    """
+    spider_kwargs = get_spider_kwargs(task_type, url_source, unique_id, celery_task_id)
+    process = billiard.Process(
+        target=_crawl_entry,
+        args=(spider_name, spider_kwargs, filename, settings_module),
+        name=f'crawl-{spider_name}-{unique_id}',
+    )
+    process.start()
+    process.join()
+    return process.exitcode
+
+
+def get_rss_mb():
+    """Current resident set size of this process in MB."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except OSError:
+        # ru_maxrss is the peak, in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _host_main(conn, settings_module, max_crawls, max_rss_mb):
+    """
+    Crawler host loop. The reactor is installed and started once; jobs arrive
+    over the pipe on a reader thread and are run with CrawlerRunner, so one
+    host serves many crawls without restarting the reactor.
+    """
+    os.chdir(project_path)
+    from scrapy.crawler import CrawlerRunner
+    from scrapy.utils.log import configure_logging
+    from scrapy.utils.reactor import install_reactor
+
+    preload(settings_module)
+    base_settings = get_crawl_settings(os.devnull, settings_module)
+    install_reactor(base_settings['TWISTED_REACTOR'])
+    configure_logging(base_settings)
+    from twisted.internet import reactor
+
+    crawls = {'count': 0}
+
+    def finish(exit_code, filename):
+        crawls['count'] += 1
+        retire = crawls['count'] >= max_crawls or get_rss_mb() >= max_rss_mb
+        conn.send({'filename': filename, 'exit_code': exit_code, 'retire': retire})
+        if retire:
+            logging.info(f"Retiring crawler host {os.getpid()} after {crawls['count']} crawls")
+            reactor.stop()
+
+    def crawl_failed(failure, filename):
+        logging.error(f"Crawl failed: {failure.getErrorMessage()}")
+        finish(1, filename)
+
+    def start_job(job):
+        filename = job['filename']
+        try:
+            runner = CrawlerRunner(get_crawl_settings(filename, settings_module))
+            crawl_defer = runner.crawl(job['spider_name'], **job['spider_kwargs'])
+        except Exception as e:
+            logging.error(f"Crawl could not start: {e}")
+            finish(1, filename)
+            return
+        crawl_defer.addCallbacks(lambda _: finish(1 if runner.bootstrap_failed else 0, filename),
+                                 crawl_failed, errbackArgs=(filename,))
+
+    def read_jobs():
+        while True:
+            try:
+                job = conn.recv()
+            except (EOFError, OSError):
+                job = None
+            if job is None:
+                reactor.callFromThread(reactor.stop)
+                return
+            reactor.callFromThread(start_job, job)
+
+    threading.Thread(target=read_jobs, name='crawler-host-reader', daemon=True).start()
+    reactor.run(installSignalHandlers=False)
+
+
+class CrawlerHost:
+    """A pre-forked process with Scrapy, the settings and spiders loaded and its reactor running."""
+
+    def __init__(self, settings_module, max_crawls, max_rss_mb):
+        self.conn, child_conn = billiard.Pipe()
+        self.process = billiard.Process(
+            target=_host_main,
+            args=(child_conn, settings_module, max_crawls, max_rss_mb),
+            name='crawler-host',
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.retired = False
+
+    def run(self, spider_name, spider_kwargs, filename):
+        """Hand a crawl to the host and block until it reports back. Returns the exit code."""
+        try:
+            self.conn.send({'spider_name': spider_name, 'spider_kwargs': spider_kwargs, 'filename': filename})
+            result = self.conn.recv()
+        except (EOFError, OSError) as e:
+            logging.error(f"Crawler host {self.process.pid} died: {e}")
+            self.retired = True
+            return -1
+        self.retired = result['retire']
+        return result['exit_code']
+
+    def is_usable(self):
+        return not self.retired and self.process.is_alive()
+
+    def close(self, timeout=10):
+        try:
+            self.conn.send(None)
+        except (EOFError, OSError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+class CrawlerPool:
+    """
+    Crawler hosts owned by one worker process. A task takes a free host, and
+    retired or dead hosts are replaced straight away so the next task finds a
+    warm one.
+    """
+
+    def __init__(self, settings_module, size, max_crawls, max_rss_mb):
+        self.settings_module = settings_module
+        self.max_crawls = max_crawls
+        self.max_rss_mb = max_rss_mb
+        self.free_hosts = queue.Queue()
+        for _ in range(size):
+            self.free_hosts.put(self.spawn_host())
+
+    def spawn_host(self):
+        return CrawlerHost(self.settings_module, self.max_crawls, self.max_rss_mb)
+
+    def run(self, spider_name, spider_kwargs, filename):
+        host = self.free_hosts.get()
+        if not host.is_usable():
+            host.close()
+            host = self.spawn_host()
+        try:
+            return host.run(spider_name, spider_kwargs, filename)
+        finally:
+            if not host.is_usable():
+                host.close()
+                host = self.spawn_host()
+            self.free_hosts.put(host)
+
+    def close(self):
+        while not self.free_hosts.empty():
+            self.free_hosts.get_nowait().close()
+
+
+# One pool per settings module, per worker process
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(settings_module):
+    from config import crawler_pool_size, crawler_max_crawls, crawler_max_rss_mb
+
+    with _pools_lock:
+        if settings_module not in _pools:
+            _pools[settings_module] = CrawlerPool(settings_module, crawler_pool_size, crawler_max_crawls, crawler_max_rss_mb)
+        return _pools[settings_module]
+
+
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def run_in_pool(spider_name, url_source, unique_id, celery_task_id, filename, task_type, settings_module):
+    """Run the spider on a free pre-warmed crawler host and return its exit code."""
+    spider_kwargs = get_spider_kwargs(task_type, url_source, unique_id, celery_task_id)
+    return get_pool(settings_module).run(spider_name, spider_kwargs, filename)
@@ -0,0 +1,7 @@
+#!/bin/bash
+
+# Install the task_logger NOTIFY trigger (idempotent) and start the dispatcher
+/home/mediaamp-main/globalscraper/scrapyenv/bin/python dispatcher.py --install-trigger
+# Proxy credit accounting table written by the crawls (idempotent)
+/home/mediaamp-main/globalscraper/scrapyenv/bin/python credits.py --install-table
+/home/mediaamp-main/globalscraper/scrapyenv/bin/python dispatcher.py &
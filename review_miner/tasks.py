@@ -1,6 +1,16 @@
-import subprocess, json, platform, sys, os, netifaces, getpass, psycopg2
+import subprocess, json, platform, sys, os, csv, shlex, netifaces, getpass, time
 from datetime import datetime
-from celeryconfig import celery, env
+from celery import group, chord
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
+from celeryconfig import celery, env, task_priorities
+from config import spider_run_mode, task_shard_size, spider_max_retries, spider_retry_delay, error_fail_codes
+import spider_runner
+import db
+from db import db_connection
+from url_sources import TaskLoggerUrlSource, open_url_source, write_url_manifest
+from checkpoint import CheckpointStore
+from credits import CreditBudget
+import metrics
 
 # Add project paths
 project_path = os.getcwd()
@@ -59,145 +69,430 @@ def get_machine_info():
 
 def update_task_logger_status(uuid, status, system_info=None):
     try:
-        conn = psycopg2.connect(env['db'])
-        cursor = conn.cursor()
-        if system_info:
-            cursor.execute(
-                "UPDATE task_logger SET status = %s, system_info = %s WHERE id = %s",
-                (status, json.dumps(system_info), uuid)
-            )
-        else:
-            cursor.execute(
-                "UPDATE task_logger SET status = %s WHERE id = %s",
-                (status, uuid)
-            )
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                if system_info:
+                    cursor.execute(
+                        "UPDATE task_logger SET status = %s, system_info = %s WHERE id = %s",
+                        (status, json.dumps(system_info), uuid)
+                    )
+                else:
+                    cursor.execute(
+                        "UPDATE task_logger SET status = %s WHERE id = %s",
+                        (status, uuid)
+                    )
     except Exception as e:
         print(f"Error updating task logger: {e}")
 
-def build_scrapy_command(spider_name, task_urls, unique_id, celery_task_id, filename, task_type, settings_module):
+def task_error_status(uuid, run_ids):
+    """
+    Final status for a task whose crawls exited cleanly, from the error counts
+    reported by the last attempt of each run (run_spider, or every shard), and
+    the error fields for its system_info. max_error_code is the most severe
+    (lowest) ErrorReason code, as in ErrorManager.
+    """
+    counts = CheckpointStore(uuid).error_counts(run_ids)
+    error_info = {
+        'max_error_code': min(counts) if counts else None,
+        'error_counts': {str(code): count for code, count in sorted(counts.items())},
+    }
+    fatal_codes = sorted(set(counts) & error_fail_codes)
+    if fatal_codes:
+        print(f'Task {uuid} reported errors {fatal_codes}, marking it FAILED')
+        return 'FAILED', error_info
+    return 'COMPLETED', error_info
+
+def build_scrapy_command(spider_name, url_source, unique_id, celery_task_id, filename, task_type, settings_module):
     if task_type in ['amz_browsenodes', 'cvs_browsenodes']:
         # Command for browsenodes (without URLs)
         cmd = f'scrapy crawl {spider_name} -a task_id="{unique_id}" -a celery_id="{celery_task_id}" -o {filename} -s SETTINGS_MODULE={settings_module}'
     else:
-        # Command for other tasks (with URLs)
-        urls_str = ','.join(task_urls)
-        cmd = f'scrapy crawl {spider_name} -a urls="{urls_str}" -a task_id="{unique_id}" -a celery_id="{celery_task_id}" -o {filename} -s SETTINGS_MODULE={settings_module}'
+        # Command for other tasks, the spider streams its URLs from the source
+        cmd = f'scrapy crawl {spider_name} -a url_source={shlex.quote(url_source)} -a task_id="{unique_id}" -a celery_id="{celery_task_id}" -o {filename} -s SETTINGS_MODULE={settings_module}'
     return cmd
 
-@celery.task(bind=True, name='tasks.run_spider')
-def run_spider(self, uuid, task_urls, spider_name, task_type, priority, queue_name):
-    try:
-        print(f'Process Started for {spider_name} *****************************************')
+def as_url_source(task_urls, uuid, celery_task_id):
+    """
+    URL source reference for a task. Messages published before URL sources
+    carry the URL list itself; it is written to a manifest file instead of
+    being passed on the command line.
+    """
+    if not task_urls or isinstance(task_urls, str):
+        return task_urls
+    return write_url_manifest(task_urls, get_manifest_path(uuid, celery_task_id)).reference
 
-        # if cron >= datetime.utcnow():
-        #     print(f'Task is scheduled for future, skipping execution.')
-        
-        update_task_logger_status(uuid, 'IN_PROGRESS')
+def get_manifest_path(uuid, celery_task_id):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'manifests', f'{uuid}__{celery_task_id}.txt')
 
-        unique_id = uuid
-        celery_task_id = self.request.id
-        timestamp = datetime.utcnow().strftime('%Y-%m-%d_%H:%M:%S')                                       
+def remove_url_manifest(uuid, celery_task_id):
+    """Delete the task's URL manifest, if it had one, once the task reached a final state."""
+    manifest_path = get_manifest_path(uuid, celery_task_id)
+    if os.path.isfile(manifest_path):
+        os.remove(manifest_path)
 
-        # Ensure target directory exists
-        new_dir = os.path.join(os.getcwd(), 'data')
-        if not os.path.exists(new_dir):
-            os.mkdir(new_dir)
+def execute_spider(spider_name, url_source, unique_id, celery_task_id, filename, task_type, settings_module, run_mode=None):
+    """Run a crawl with the configured run mode and return its exit code."""
+    run_mode = run_mode or spider_run_mode
+    if run_mode == 'inprocess':
+        print(f'Running {spider_name} in-process')
+        return spider_runner.run_in_process(spider_name, url_source, unique_id, celery_task_id, filename, task_type, settings_module)
+    if run_mode == 'pool':
+        print(f'Running {spider_name} on a crawler host')
+        return spider_runner.run_in_pool(spider_name, url_source, unique_id, celery_task_id, filename, task_type, settings_module)
 
-        filename = os.path.join(new_dir, f'{spider_name}__{unique_id}__{celery_task_id}__{timestamp}.csv')
+    # Build the scrapy command
+    cmd = build_scrapy_command(spider_name, url_source, unique_id, celery_task_id, filename, task_type, settings_module)
 
-        # Determine the settings module
-        settings_module = get_settings_module(spider_name)
+    project_path = os.path.dirname(os.path.abspath(__file__))
 
-        # Build the scrapy command
-        cmd = build_scrapy_command(spider_name, task_urls, unique_id, celery_task_id, filename, task_type, settings_module)
+    # Set the PYTHONPATH environment variable
+    env = os.environ.copy()
+    env['PYTHONPATH'] = project_path
 
-        # Ensure the working directory is set to the project path
-        project_path = os.path.dirname(os.path.abspath(__file__))
-        os.chdir(project_path)
-        
-        # Set the PYTHONPATH environment variable
-        env = os.environ.copy()
-        env['PYTHONPATH'] = project_path
+    # Set the SCRAPY_SETTINGS_MODULE environment variable
+    env['SCRAPY_SETTINGS_MODULE'] = settings_module
+
+    print(f'Running command: {cmd}')
+    return subprocess.call(cmd, shell=True, env=env)
+
+@worker_init.connect
+def preload_spiders(**kwargs):
+    # Import Scrapy and the spiders once in the worker so forked crawls start warm
+    if spider_run_mode in ['inprocess', 'pool']:
+        spider_runner.preload()
+
+@worker_process_init.connect
+def reset_db_pool(**kwargs):
+    # Connections inherited from the parent worker must not be shared after fork
+    db.reset_pool()
+
+@worker_process_init.connect
+def start_crawler_pool(**kwargs):
+    # Each worker process forks its crawler hosts before the first task arrives
+    if spider_run_mode == 'pool':
+        spider_runner.get_pool('amazon.settings')
 
-        # Set the SCRAPY_SETTINGS_MODULE environment variable
-        env['SCRAPY_SETTINGS_MODULE'] = settings_module
+@worker_process_init.connect
+def start_metrics_exporter(**kwargs):
+    # run_spider durations, exported per worker process
+    metrics.start_exporter()
 
-        print(f'Running command: {cmd}')
-        result = subprocess.call(cmd, shell=True, env=env)
+@worker_process_shutdown.connect
+def close_worker_pools(**kwargs):
+    spider_runner.close_pools()
+    db.close_pool()
 
-        # Check the result of the subprocess call
+def get_output_filename(spider_name, unique_id, celery_task_id):
+    timestamp = datetime.utcnow().strftime('%Y-%m-%d_%H:%M:%S')
+
+    # Ensure target directory exists
+    new_dir = os.path.join(os.getcwd(), 'data')
+    if not os.path.exists(new_dir):
+        os.mkdir(new_dir)
+
+    return os.path.join(new_dir, f'{spider_name}__{unique_id}__{celery_task_id}__{timestamp}.csv')
+
+def crawl_task_urls(uuid, url_source, spider_name, task_type, celery_task_id, shard_index=None):
+    """
+    Run the spider over the task's URL source and return (exit code, output CSV).
+    When an earlier run of the task (or shard) left an output behind, the
+    spider skips the checkpointed URLs and its rows are appended to that output.
+    Outputs are local files: when the earlier run's output is not on this host
+    (the retry landed on another worker), its URLs are un-checkpointed and
+    crawled again into a new output.
+    """
+    url_source = as_url_source(url_source, uuid, celery_task_id)
+    filename = get_output_filename(spider_name, uuid, celery_task_id)
+
+    checkpoint = CheckpointStore(uuid)
+    resumed_output = checkpoint.get_output(shard_index)
+    if resumed_output and os.path.isfile(resumed_output):
+        print(f'Resuming task {uuid}, appending to {resumed_output}')
+    else:
+        if resumed_output:
+            print(f'Output {resumed_output} of task {uuid} is not on this host, crawling its URLs again')
+            # A shard only forgets its own URLs, the other shards' outputs are still valid
+            shard_urls = open_url_source(url_source) if shard_index is not None and url_source else None
+            checkpoint.forget_done(shard_urls)
+        resumed_output = None
+        checkpoint.set_output(filename, shard_index)
+    # Errors of a failed earlier attempt do not decide this attempt's status
+    checkpoint.reset_error_counts(celery_task_id)
+
+    # Determine the settings module
+    settings_module = get_settings_module(spider_name)
+
+    # Ensure the working directory is set to the project path
+    project_path = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(project_path)
+
+    result = execute_spider(spider_name, url_source, uuid, celery_task_id, filename, task_type, settings_module)
+
+    if resumed_output:
+        append_csv_output(filename, resumed_output)
+        filename = resumed_output
+    return result, filename
+
+def merge_csv_outputs(part_files, output_file):
+    """
+    Concatenate spider CSV outputs into output_file. Parts may carry different
+    columns (listing ads vs products), so the header is the union of all part
+    headers. Parts that were never written (no items scraped) are skipped.
+    """
+    part_files = [part for part in part_files if part and os.path.isfile(part) and os.path.getsize(part) > 0]
+
+    fieldnames = []
+    for part in part_files:
+        with open(part, newline='', encoding='utf-8') as part_csv:
+            for field in next(csv.reader(part_csv), []):
+                if field not in fieldnames:
+                    fieldnames.append(field)
+
+    rows = 0
+    with open(output_file, 'w', newline='', encoding='utf-8') as output_csv:
+        writer = csv.DictWriter(output_csv, fieldnames=fieldnames)
+        writer.writeheader()
+        for part in part_files:
+            with open(part, newline='', encoding='utf-8') as part_csv:
+                for row in csv.DictReader(part_csv):
+                    writer.writerow(row)
+                    rows += 1
+    return rows
+
+def count_csv_rows(path):
+    """Data rows of a spider CSV output; 0 when it was never written."""
+    if not path or not os.path.isfile(path) or os.path.getsize(path) == 0:
+        return 0
+    with open(path, newline='', encoding='utf-8') as output_csv:
+        return sum(1 for _ in csv.DictReader(output_csv))
+
+def remove_csv_parts(part_files, output_file):
+    """Delete part CSVs once they have been merged into output_file."""
+    for part in part_files:
+        if part and part != output_file and os.path.isfile(part):
+            os.remove(part)
+
+def append_csv_output(part_file, output_file):
+    """Append a resumed crawl's CSV to the task's existing output and remove the part."""
+    merged_file = output_file + '.merging'
+    merge_csv_outputs([output_file, part_file], merged_file)
+    os.replace(merged_file, output_file)
+    remove_csv_parts([part_file], output_file)
+
+@celery.task(bind=True, name='tasks.run_spider')
+def run_spider(self, uuid, url_source, spider_name, task_type, priority, queue_name):
+    started = time.monotonic()
+    try:
+        print(f'Process Started for {spider_name} *****************************************')
+
+        # if cron >= datetime.utcnow():
+        #     print(f'Task is scheduled for future, skipping execution.')
+        
+        update_task_logger_status(uuid, 'IN_PROGRESS')
+
+        result, filename = crawl_task_urls(uuid, url_source, spider_name, task_type, self.request.id)
+
+        # Check the result of the crawl
         if result != 0:
             raise Exception(f'Command failed with exit code {result}')
 
-        system_info = get_machine_info()
-        update_task_logger_status(uuid, 'COMPLETED', system_info)
+        status, error_info = task_error_status(uuid, [self.request.id])
+        system_info = {**get_machine_info(), **error_info}
+        update_task_logger_status(uuid, status, system_info)
+        CheckpointStore(uuid).clear(run_ids=[self.request.id])
+        remove_url_manifest(uuid, self.request.id)
+        metrics.TASK_DURATION.observe(time.monotonic() - started, spider=spider_name, status=status)
 
         print(f'Process End for {spider_name} *****************************************')
         print(f'Output CSV: {filename}')
         return filename
     except Exception as e:
         print(f'Error in running spider {spider_name}: {str(e)}')
+        if self.request.retries < spider_max_retries:
+            # The retry skips checkpointed URLs and appends to the same output
+            print(f'Retrying {spider_name} for task {uuid} in {spider_retry_delay}s')
+            metrics.TASK_DURATION.observe(time.monotonic() - started, spider=spider_name, status='RETRY')
+            raise self.retry(countdown=spider_retry_delay, max_retries=spider_max_retries)
+        update_task_logger_status(uuid, 'FAILED')
+        remove_url_manifest(uuid, self.request.id)
+        metrics.TASK_DURATION.observe(time.monotonic() - started, spider=spider_name, status='FAILED')
+
+@celery.task(bind=True, name='tasks.run_spider_shard')
+def run_spider_shard(self, uuid, shard_index, url_source, spider_name, task_type, priority, queue_name):
+    """
+    Crawl one chunk of a sharded task_logger row. A failed shard is retried
+    like run_spider, resuming from its checkpoint and output. The parent row's
+    final status is left to merge_spider_shards, so once out of retries a
+    shard reports the failure in its result for the chord callback.
+    """
+    print(f'Process Started for {spider_name} shard {shard_index} *****************************************')
+    update_task_logger_status(uuid, 'IN_PROGRESS')
+    try:
+        result, filename = crawl_task_urls(uuid, url_source, spider_name, task_type, self.request.id, shard_index=shard_index)
+        if result != 0:
+            raise Exception(f'Command failed with exit code {result}')
+    except Exception as e:
+        print(f'Error in running spider {spider_name} shard {shard_index}: {str(e)}')
+        if self.request.retries < spider_max_retries:
+            print(f'Retrying {spider_name} shard {shard_index} for task {uuid} in {spider_retry_delay}s')
+            raise self.retry(countdown=spider_retry_delay, max_retries=spider_max_retries)
+        result, filename = -1, CheckpointStore(uuid).get_output(shard_index)
+    remove_url_manifest(uuid, self.request.id)
+    print(f'Process End for {spider_name} shard {shard_index}, exit code {result} *****************************************')
+    # The callback may run on another host: it checks the part it can see against these
+    return {'shard_index': shard_index, 'exit_code': result, 'filename': filename, 'run_id': self.request.id,
+            'rows': count_csv_rows(filename), 'hostname': platform.node()}
+
+@celery.task(bind=True, name='tasks.merge_spider_shards')
+def merge_spider_shards(self, shard_results, uuid, spider_name):
+    """
+    Chord callback: merge per-shard CSVs and set the parent task_logger status.
+    Parts are read from this host's data/, so a shard whose rows are not
+    readable here (it ran on another host) fails the task rather than being
+    merged as empty.
+    """
+    try:
+        shard_results = sorted(shard_results, key=lambda shard: shard['shard_index'])
+        failed_shards = [shard['shard_index'] for shard in shard_results if shard['exit_code'] != 0]
+
+        missing_parts = [
+            f"{shard['shard_index']} ({shard['filename']} on {shard['hostname']})"
+            for shard in shard_results
+            if shard['exit_code'] == 0 and shard['rows'] and count_csv_rows(shard['filename']) != shard['rows']
+        ]
+        if missing_parts:
+            raise Exception(f'Output of shards {", ".join(missing_parts)} is missing or incomplete on {platform.node()}')
+
+        filename = get_output_filename(spider_name, uuid, self.request.id)
+        rows = merge_csv_outputs([shard['filename'] for shard in shard_results], filename)
+        expected_rows = sum(shard['rows'] for shard in shard_results if shard['exit_code'] == 0)
+        if not failed_shards and rows != expected_rows:
+            raise Exception(f'Merged {rows} rows for task {uuid}, shards reported {expected_rows}')
+        print(f'Merged {len(shard_results)} shards ({rows} rows) for {spider_name} into {filename}')
+
+        if failed_shards:
+            print(f'Shards {failed_shards} of task {uuid} failed')
+            update_task_logger_status(uuid, 'FAILED')
+        else:
+            run_ids = [shard['run_id'] for shard in shard_results]
+            status, error_info = task_error_status(uuid, run_ids)
+            update_task_logger_status(uuid, status, {**get_machine_info(), **error_info})
+            CheckpointStore(uuid).clear(run_ids=run_ids, parts=[shard['shard_index'] for shard in shard_results])
+            # Only now: while the checkpoint is kept, a re-run resumes into these parts
+            remove_csv_parts([shard['filename'] for shard in shard_results], filename)
+        return filename
+    except Exception as e:
+        print(f'Error merging shards for {spider_name}: {str(e)}')
         update_task_logger_status(uuid, 'FAILED')
+
+def get_broker_priority(priority):
+    """Broker priority level for a priority name ('HIGH', 'NORMAL', 'LOW'); unknown names run at NORMAL."""
+    return task_priorities.get(str(priority).upper(), task_priorities['NORMAL'])
+
+def dispatch_spider_task(uuid, url_count, spider_name, task_type, priority, queue_name, task_id=None):
+    """
+    Send a task_logger row to the workers. Messages carry a task_logger URL
+    source reference, not the URLs. Rows with more than task_shard_size URLs
+    are split into a group of shards over slices of task_urls, with a chord
+    callback that merges the outputs. task_id is the Celery id of the task to
+    track (the callback for chords). Every message is sent at the broker
+    priority level of `priority`.
+    """
+    broker_priority = get_broker_priority(priority)
+    if url_count and url_count > task_shard_size:
+        shard_sources = [
+            TaskLoggerUrlSource(uuid, offset=offset, limit=task_shard_size).reference
+            for offset in range(0, url_count, task_shard_size)
+        ]
+        header = group(
+            run_spider_shard.s(uuid, shard_index, shard_source, spider_name, task_type, priority, queue_name).set(queue=queue_name, priority=broker_priority)
+            for shard_index, shard_source in enumerate(shard_sources)
+        )
+        print(f'Sharding task {uuid} into {len(shard_sources)} shards of up to {task_shard_size} URLs')
+        return chord(header)(merge_spider_shards.s(uuid, spider_name).set(queue=queue_name, priority=broker_priority, task_id=task_id))
+
+    return run_spider.apply_async(
+        args=[uuid, TaskLoggerUrlSource(uuid).reference, spider_name, task_type, priority, queue_name],
+        queue=queue_name,
+        priority=broker_priority,
+        task_id=task_id
+    )
         
 class Publisher:
+    # Claim due PENDING rows in one statement: rows locked by another publisher are
+    # skipped, and each claimed row gets the Celery id its task will be sent with.
+    # Rows whose priority the credit budget holds back are left PENDING untouched
+    claim_query = """
+        WITH due AS (
+            SELECT id FROM task_logger
+            WHERE status = 'PENDING' AND task_name = %(task_name)s
+              AND start_date = %(today)s AND functionality->>'cron_time' <= %(now)s
+              AND UPPER(COALESCE(functionality->>'priority', %(default_priority)s)) = ANY(%(priorities)s)
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE task_logger
+        SET status = 'PUBLISHED', celery_task_id = gen_random_uuid()
+        FROM due
+        WHERE task_logger.id = due.id
+        RETURNING task_logger.id, task_logger.celery_task_id, jsonb_array_length(to_jsonb(task_logger.task_urls)),
+                  task_logger.functionality->>'priority'
+    """
+
+    def claim_due_tasks(self, cursor, spider_name, now=None, priorities=None, default_priority='NORMAL'):
+        """
+        Mark due tasks PUBLISHED and return (id, celery_task_id, url_count, row priority) for each.
+        Only rows whose priority (default_priority when the row has none) is in `priorities` are claimed.
+        """
+        now = now or datetime.now()
+        cursor.execute(self.claim_query, {
+            'task_name': spider_name, 'today': now.date(), 'now': now.strftime('%H:%M'),
+            'priorities': list(priorities or task_priorities), 'default_priority': str(default_priority).upper(),
+        })
+        return cursor.fetchall()
+
     def publish_task(self, spider_name, task_type, priority):
         try:
-            conn = psycopg2.connect(env['db'])
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, task_urls, start_date, functionality FROM task_logger WHERE status = 'PENDING' AND task_name = %s", (spider_name,))
-            print(f'Pending tasks for {spider_name}: {cursor.rowcount}')
-            pending_tasks = cursor.fetchall()
-
-            if not pending_tasks:
-                print(f'No pending tasks for {spider_name}.')
-                return      
-            
-             # Determine the queue name based on the spider name
-            if spider_name.startswith('amz'):
-                queue_name = 'amazon'
-            elif spider_name.startswith('cvs'):
-                queue_name = 'cvs'
-            else:
-                queue_name = 'default'
-            
-            for task in pending_tasks:
-                uuid, task_urls, start_date, functionality= task  
-                task_urls = task_urls
-                cron_time = functionality.get('cron_time')
-
-                if start_date == datetime.now().date() and cron_time <= datetime.now().strftime('%H:%M'): 
-                
-                    result = run_spider.apply_async(
-                            args=[str(uuid), task_urls, spider_name, task_type, priority, queue_name],
-                            queue=queue_name
-                        )
-                    result_id = result.id
-
-                    # Update task status and store Celery task ID
-                    cursor.execute(
-                        "UPDATE task_logger SET status = %s, celery_task_id = %s WHERE id = %s",
-                        ('PUBLISHED', result_id, uuid)
-                    )
-                    print(f'Starting task {result_id} for spider {spider_name} on queue {queue_name}')
+            budget = CreditBudget()
+            budget_state = budget.state()
+            if budget_state != 'ok':
+                print(f'Proxy credit budget {budget_state}: {budget.spent():.0f} of {budget.limit:.0f} spent today')
+            with db_connection() as conn:
+                with conn.cursor() as cursor:
+                    claimed_tasks = self.claim_due_tasks(cursor, spider_name, priorities=budget.allowed_priorities(budget_state), default_priority=priority)
                     conn.commit()
+                    print(f'Due tasks claimed for {spider_name}: {len(claimed_tasks)}')
 
-                else:
-                    print(f'Task {uuid} for spider {spider_name} is not due yet.')
+                    if not claimed_tasks:
+                        print(f'No due tasks for {spider_name}.')
+                        return
+
+                    # Determine the queue name based on the spider name
+                    if spider_name.startswith('amz'):
+                        queue_name = 'amazon'
+                    elif spider_name.startswith('cvs'):
+                        queue_name = 'cvs'
+                    else:
+                        queue_name = 'default'
 
-            cursor.close()
-            conn.close()
+                    unpublished = []
+                    for uuid, celery_task_id, url_count, row_priority in claimed_tasks:
+                        task_priority = budget.adjust_priority(row_priority or priority, budget_state)
+                        try:
+                            dispatch_spider_task(str(uuid), url_count, spider_name, task_type, task_priority, queue_name, task_id=str(celery_task_id))
+                            print(f'Starting task {celery_task_id} for spider {spider_name} on queue {queue_name} at {task_priority} priority')
+                        except Exception as e:
+                            print(f'Error publishing task {uuid}: {e}')
+                            unpublished.append(str(uuid))
+
+                    # Hand tasks that never reached the broker back to the next publish run
+                    if unpublished:
+                        cursor.execute(
+                            "UPDATE task_logger SET status = 'PENDING', celery_task_id = NULL WHERE id::text = ANY(%s)",
+                            (unpublished,)
+                        )
 
         except Exception as e:
             print(f'Error occurred: {e}')
-            if conn:
-                conn.rollback()
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
 
 # Publishing task for beat 
 @celery.task(name='tasks.publish_scraper_task')
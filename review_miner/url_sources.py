@@ -0,0 +1,166 @@
+import os
+import logging
+import redis
+from abc import ABC, abstractmethod
+from config import environment, app_env
+from checkpoint import CheckpointStore
+from db import db_connection
+
+env = environment[app_env]
+
+
+class UrlSource(ABC):
+    """
+    A lazily iterated stream of spider input URLs. Celery messages and spider
+    arguments carry only the source reference (see `reference`), never the list.
+    """
+    scheme = None
+
+    @abstractmethod
+    def __iter__(self):
+        pass
+
+    @property
+    @abstractmethod
+    def reference(self):
+        pass
+
+
+class FileUrlSource(UrlSource):
+    """URLs read one per line from a manifest file."""
+    scheme = 'file'
+
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        with open(self.path, encoding='utf-8') as manifest:
+            for line in manifest:
+                url = line.strip()
+                if url:
+                    yield url
+
+    @property
+    def reference(self):
+        return f'{self.scheme}:{self.path}'
+
+
+class RedisListUrlSource(UrlSource):
+    """URLs read in batches from a Redis list. The list is not consumed, so a rerun sees the same URLs."""
+    scheme = 'redis'
+
+    def __init__(self, key, redis_url=None, batch_size=1000):
+        self.key = key
+        self.redis_url = redis_url or env['redis']
+        self.batch_size = batch_size
+
+    def __iter__(self):
+        client = redis.Redis.from_url(self.redis_url, decode_responses=True)
+        start = 0
+        while True:
+            batch = client.lrange(self.key, start, start + self.batch_size - 1)
+            if not batch:
+                break
+            for url in batch:
+                if url.strip():
+                    yield url.strip()
+            start += self.batch_size
+
+    @property
+    def reference(self):
+        return f'{self.scheme}:{self.key}'
+
+
+class TaskLoggerUrlSource(UrlSource):
+    """
+    URLs read from a task_logger row's task_urls in batches of batch_size.
+    Each batch is fetched on a pooled connection that is returned before its
+    URLs are yielded, so a crawl holds no connection or transaction while it
+    runs. offset/limit select a slice of the list, used for shards.
+    """
+    scheme = 'task_logger'
+
+    query = """
+        SELECT t.url
+        FROM task_logger, jsonb_array_elements_text(to_jsonb(task_logger.task_urls)) WITH ORDINALITY AS t(url, idx)
+        WHERE task_logger.id = %s AND t.idx > %s AND t.idx <= %s
+        ORDER BY t.idx
+    """
+
+    def __init__(self, task_id, offset=0, limit=None, batch_size=5000):
+        self.task_id = task_id
+        self.offset = int(offset)
+        self.limit = int(limit) if limit is not None else None
+        self.batch_size = batch_size
+
+    def fetch(self, start, end):
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(self.query, (self.task_id, start, end))
+                return [url for (url,) in cursor.fetchall()]
+
+    def __iter__(self):
+        upper = self.offset + self.limit if self.limit is not None else 2 ** 31 - 1
+        start = self.offset
+        while start < upper:
+            end = min(start + self.batch_size, upper)
+            batch = self.fetch(start, end)
+            for url in batch:
+                if url.strip():
+                    yield url.strip()
+            if len(batch) < end - start:
+                break
+            start = end
+
+    @property
+    def reference(self):
+        if self.limit is None and not self.offset:
+            return f'{self.scheme}:{self.task_id}'
+        return f'{self.scheme}:{self.task_id}:{self.offset}:{self.limit}'
+
+
+def open_url_source(reference):
+    """
+    Build a UrlSource from its reference:
+        file:/path/to/manifest.txt
+        redis:<list key>
+        task_logger:<task id>[:<offset>:<limit>]
+    """
+    scheme, _, value = reference.partition(':')
+    if scheme == FileUrlSource.scheme:
+        return FileUrlSource(value)
+    if scheme == RedisListUrlSource.scheme:
+        return RedisListUrlSource(value)
+    if scheme == TaskLoggerUrlSource.scheme:
+        parts = value.split(':')
+        if len(parts) == 3:
+            return TaskLoggerUrlSource(parts[0], offset=parts[1], limit=parts[2])
+        return TaskLoggerUrlSource(value)
+    raise ValueError(f"Unsupported URL source: {reference}")
+
+
+def write_url_manifest(task_urls, path):
+    """Write a URL list to a manifest file and return the file source for it."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as manifest:
+        for url in task_urls:
+            manifest.write(url.strip() + '\n')
+    logging.info(f"Wrote {len(task_urls)} URLs to manifest {path}")
+    return FileUrlSource(path)
+
+
+def resolve_start_urls(urls='', url_source='', default_urls=None, task_id=None):
+    """
+    Spider start URLs: the URL source if given, else the legacy comma separated
+    `urls` argument. With a task_id, URLs an earlier run of the task finished
+    are skipped.
+    """
+    if url_source:
+        start_urls = open_url_source(url_source)
+    elif urls:
+        start_urls = urls.split(',')
+    else:
+        return default_urls or []
+    if task_id:
+        return CheckpointStore(task_id).pending_urls(start_urls)
+    return start_urls